@@ -1,4 +1,7 @@
 import itertools
+import multiprocessing
+import sys
+from time import sleep
 import numpy as np
 import tensorflow as tf
 import tensorflow.contrib.layers as layers
@@ -13,6 +16,7 @@ from baselines.common.schedules import PiecewiseSchedule, LinearSchedule
 from env import VehicularFogEnv
 from gym.wrappers import FlattenObservation
 from constants import TIME_MULTIPLIER
+from rollout import RolloutWorkers
 
 
 def model(inpt, num_actions, scope, reuse=False):
@@ -28,9 +32,82 @@ def model(inpt, num_actions, scope, reuse=False):
         return out
 
 
+def train_parallel(num_workers, batch_size=32, episodes=1000, broadcast_every=250):
+    """
+    Trains the q network on the transitions streamed by rollout workers that
+    act with the weights broadcast every broadcast_every steps
+    """
+    # The workers size their copy of the network from the observation space of one env
+    env = VehicularFogEnv(config=None)
+    layer_sizes = [env.observation_space.shape[0], 512, 256, env.action_space.n]
+    workers = RolloutWorkers(num_workers, layer_sizes)
+    try:
+        with U.make_session(num_cpu=multiprocessing.cpu_count()):
+            act, train, update_target, debug = deepq.build_train(
+                make_obs_ph=lambda name: ObservationInput(
+                    env.observation_space, name=name),
+                q_func=model,
+                num_actions=env.action_space.n,
+                optimizer=tf.train.RMSPropOptimizer(learning_rate=5e-4),
+                gamma=0,
+            )
+            replay_buffer = ReplayBuffer(50000)
+            exploration = LinearSchedule(
+                schedule_timesteps=10000, initial_p=1, final_p=0.1)
+            U.initialize()
+            update_target()
+            q_vars = tf.trainable_variables("deepq/q_func")
+            workers.publish(U.get_session().run(q_vars), exploration.value(0))
+
+            # Rewards of the finished episodes and of the running episode of every worker
+            episode_rewards = []
+            running_rewards = [0.0]*num_workers
+            t = 0
+            while len(episode_rewards) < episodes:
+                drained = False
+                for worker, (obses, actions, rewards, obses_tp1, dones, episode_ends) in enumerate(workers.drain()):
+                    for k in range(len(actions)):
+                        replay_buffer.add(obses[k], actions[k], rewards[k],
+                                          obses_tp1[k], float(dones[k]))
+                        running_rewards[worker] += rewards[k]
+                        if episode_ends[k]:
+                            episode_rewards.append(running_rewards[worker])
+                            running_rewards[worker] = 0.0
+                            logger.record_tabular(
+                                "Episode Reward", episode_rewards[-1])
+                            logger.record_tabular("worker", worker)
+                            logger.record_tabular("steps", t)
+                            logger.record_tabular(
+                                "episodes", len(episode_rewards))
+                            logger.dump_tabular()
+                        if t > 250:
+                            obses_t, actions_t, rewards_t, obses_tp1_t, dones_t = replay_buffer.sample(
+                                batch_size)
+                            train(obses_t, actions_t, rewards_t, obses_tp1_t,
+                                  dones_t, np.ones_like(rewards_t))
+                        if t % 250 == 0:
+                            update_target()
+                        if t % broadcast_every == 0:
+                            workers.publish(U.get_session().run(
+                                q_vars), exploration.value(t))
+                        t += 1
+                        drained = True
+                workers.set_exploration(exploration.value(t))
+                if not drained:
+                    sleep(0.01)
+            U.save_variables(f'./checkpoints/final_model_res_parallel.pth')
+    finally:
+        workers.close()
+
+
 if __name__ == '__main__':
     BATCH_SIZE = 32
     EPISODES = 1000
+    # Set to the number of rollout processes to train on all cores
+    ROLLOUT_WORKERS = 0
+    if ROLLOUT_WORKERS:
+        train_parallel(ROLLOUT_WORKERS, BATCH_SIZE, EPISODES)
+        sys.exit()
     with U.make_session(num_cpu=8):
         # Create the environment
         env = VehicularFogEnv(config=None)
@@ -4,7 +4,7 @@ from gym.utils import seeding
 from gym.spaces import flatten
 import numpy as np
 from constants import CACHE_CONTENT_TYPES, TIME_MULTIPLIER, TRANSMIT_POWER_FN2CLOUD, TRANSMIT_POWER_FN2VEHICLE
-from utils import distance, find_feasible_fog_nodes
+from utils import distance
 from simulation import Simulation
 from itertools import chain
 import math
@@ -18,6 +18,57 @@ RESOURCE_REDUCTION_POS_WEIGHT = 0.1
 RESOURCE_REDUCTION_NEG_WEIGHT = 0.005
 
 
+class ObservationBuilder:
+    """
+    Builds the observations of services into float32 arrays, the node level
+    arrays are cached for every simulation tick
+    """
+
+    def __init__(self, sim_instance):
+        self.sim_instance = sim_instance
+        self.n = len(sim_instance.fog_nodes)
+        self.size = 3+3*self.n
+        # cache_bits[content_type] is the cache vector of the content type over the fog nodes
+        self.cache_bits = np.ascontiguousarray(np.array(
+            [fn.cache_array for fn in sim_instance.fog_nodes], dtype=np.float32).T)
+        self._base = np.zeros(self.size, dtype=np.float32)
+        self._tick = None
+
+    def invalidate(self):
+        """Recomputes the node levels on the next observation, called when services are migrated"""
+        self._tick = None
+
+    def _refresh(self):
+        now = self.sim_instance.env.now
+        if self._tick == now:
+            return
+        levels = np.array([fn.resource_container.level
+                           for fn in self.sim_instance.fog_nodes], dtype=float)
+        mn, mx = levels.min(), levels.max()
+        self._base[3+self.n:3+2*self.n] = 10000
+        self._base[3+2*self.n:] = (levels-mn)/(mx-mn) if mx > mn else 0
+        self._tick = now
+
+    def build(self, service, out=None):
+        """Fills out, or a new array, with the observation of the service"""
+        self._refresh()
+        if out is None:
+            out = np.empty(self.size, dtype=np.float32)
+        out[:] = self._base
+        n = self.n
+        curr_fog_node = self.sim_instance.get_service_node_mapping(service)
+        out[3:3+n] = self.cache_bits[service.content_type]
+        resource_blocks = out[3+n:3+2*n]
+        for fn in self.sim_instance.fog_node_index.find_feasible_fog_nodes(service.vehicle):
+            resource_blocks[fn.id] = 0.1*fn.get_resource_blocks(service)
+        curr_resource_blocks = curr_fog_node.get_resource_blocks(service)
+        resource_blocks[curr_fog_node.id] = 0.1*curr_resource_blocks
+        out[0] = curr_fog_node.cache_array[service.content_type]
+        out[1] = 0.1*curr_resource_blocks
+        out[2] = service.id
+        return out
+
+
 class VehicularFogEnv(Env):
 
     def __init__(self, config):
@@ -28,6 +79,7 @@ class VehicularFogEnv(Env):
             self.sim_instance = Simulation()
         else:
             self.sim_instance = Simulation(self.config)
+        self.observation_builder = ObservationBuilder(self.sim_instance)
         # Actions determine to which fog node we need to migrate the service
         self.n_actions = len(self.sim_instance.fog_nodes)
         self.action_space = spaces.Discrete(self.n_actions)
@@ -45,26 +97,8 @@ class VehicularFogEnv(Env):
         while self.sim_instance.env.now-time >= TIME_MULTIPLIER:
             self.sim_instance.env.step()
 
-    def get_observation(self, service):
-        curr_fog_node = self.sim_instance.get_service_node_mapping(service)
-        feasible_fog_nodes = find_feasible_fog_nodes(
-            self.sim_instance.fog_nodes, service.vehicle)
-        fog_nodes = [10000]*self.n_actions
-        for fn in feasible_fog_nodes:
-            fog_nodes[fn.id] = 0.1*fn.get_resource_blocks(service)
-        fog_nodes[curr_fog_node.id] = 0.1*curr_fog_node.get_resource_blocks(
-            service)
-        levels = [fn.resource_container.level for fn in self.sim_instance.fog_nodes]
-        mn, mx = min(levels), max(levels)
-        for i, l in enumerate(levels):
-            levels[i] = (l-mn)/(mx-mn)
-        # print(curr_fog_node.get_resource_blocks(
-        #     service), curr_fog_node.capacity, curr_fog_node.get_resource_blocks(
-        #     service)/curr_fog_node.capacity)
-        obs = [curr_fog_node.cache_array[service.content_type], 0.1*curr_fog_node.get_resource_blocks(
-            service), service.id] + [fn.cache_array[service.content_type] for fn in self.sim_instance.fog_nodes] + fog_nodes + levels
-        # print(obs)
-        return np.asfarray(obs)
+    def get_observation(self, service, out=None):
+        return self.observation_builder.build(service, out)
 
     def step(self, action, service_id):
         self._current_service_id = service_id
@@ -105,6 +139,7 @@ class VehicularFogEnv(Env):
                     # print(reward)
                     self.sim_instance.orchestration_module.migrate(
                         curr_fog_node.id, action, service.vehicle.id)
+                    self.observation_builder.invalidate()
                     new_observation = self.get_observation(service)
         else:
             reward = 0
@@ -118,17 +153,23 @@ class VehicularFogEnv(Env):
         return new_observation, reward, False, {'done': done}
 
     def reset(self):
+        # The simulation of the last episode is stepped by hand and never run to completion
+        self.sim_instance.close()
         if self.config is None:
             config = random.choice(
                 ['./configs/sa.json', './configs/caa.json', './configs/coa.json'])
             self.sim_instance = Simulation(config=config)
         else:
             self.sim_instance = Simulation(config=self.config)
+        self.observation_builder = ObservationBuilder(self.sim_instance)
         return self.observation_space.sample()
 
     def render(self):
         pass
 
+    def close(self):
+        self.sim_instance.close()
+
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
         random.seed(seed)
@@ -0,0 +1,112 @@
+import atexit
+import os
+import queue
+import threading
+import numpy as np
+
+ALLOCATION = 0
+REJECTION = 1
+MIGRATION = 2
+DEPARTURE = 3
+FAILURE = 4
+EVENT_TYPES = ["allocation", "rejection",
+               "migration", "departure", "failure"]
+
+# Fog node of the rows that have no source or target
+NO_NODE = -1
+ROW_DTYPE = np.dtype([
+    ("time", "<f8"),
+    ("type", "u1"),
+    ("service", "<i8"),
+    ("vehicle", "<i8"),
+    ("source", "<i4"),
+    ("target", "<i4"),
+])
+# Bump when the layout of the rows changes
+FORMAT_VERSION = 1
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("row_size", "<u4"),
+])
+MAGIC = b"SIMVFCEV"
+
+
+class EventLog:
+    """
+    Writes fixed width binary rows of the service events of a simulation.
+    Rows are written into blocks of a ring that a background thread flushes
+    to the file, the simulation only waits when every block is full
+    """
+
+    def __init__(self, path, block_rows=4096, blocks=4):
+        self.path = path
+        self._file = open(path, "wb")
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header[0] = (MAGIC, FORMAT_VERSION, ROW_DTYPE.itemsize)
+        self._file.write(header.tobytes())
+        self._free = queue.Queue()
+        for _ in range(blocks):
+            self._free.put(np.empty(block_rows, dtype=ROW_DTYPE))
+        self._full = queue.Queue()
+        self._block = self._free.get()
+        self._size = 0
+        self._writer = threading.Thread(target=self._write_blocks, daemon=True)
+        self._writer.start()
+        self.closed = False
+        # Simulations that are stepped by hand are never closed by Simulation.run
+        atexit.register(self.close)
+
+    def _write_blocks(self):
+        while True:
+            block, size = self._full.get()
+            if block is None:
+                break
+            self._file.write(block[:size].tobytes())
+            self._free.put(block)
+        self._file.close()
+
+    def log(self, time, event_type, service, vehicle, source=NO_NODE, target=NO_NODE):
+        if self.closed:
+            # The writer has exited, so the ring would never get a free block again
+            raise ValueError(f'Event log {self.path} is closed')
+        self._block[self._size] = (
+            time, event_type, service, vehicle, source, target)
+        self._size += 1
+        if self._size == len(self._block):
+            self.flush()
+
+    def flush(self):
+        """Hands the rows written so far to the writer thread"""
+        if self._size and not self.closed:
+            self._full.put((self._block, self._size))
+            self._block = self._free.get()
+            self._size = 0
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        self._full.put((None, 0))
+        self._writer.join()
+        # Lets the log and its blocks be freed once the simulation is gone
+        atexit.unregister(self.close)
+
+
+def load_event_log(path):
+    """Returns the columns of an event log as arrays memory mapped from the file"""
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) == 0 or header[0]["magic"] != MAGIC:
+        raise ValueError(f'{path} is not an event log')
+    if header[0]["version"] != FORMAT_VERSION or header[0]["row_size"] != ROW_DTYPE.itemsize:
+        raise ValueError(
+            f'Event log {path} has version {header[0]["version"]}, expected {FORMAT_VERSION}')
+    # A log that was not closed may end with a partially written row
+    count = (os.path.getsize(path)-HEADER_DTYPE.itemsize)//ROW_DTYPE.itemsize
+    if count == 0:
+        rows = np.empty(0, dtype=ROW_DTYPE)
+    else:
+        rows = np.memmap(path, dtype=ROW_DTYPE, mode="r",
+                         offset=HEADER_DTYPE.itemsize, shape=(count,))
+    return {name: rows[name] for name in ROW_DTYPE.names}
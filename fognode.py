@@ -1,11 +1,42 @@
 from simpy.resources.container import Container
+from simpy.events import Event, URGENT
 from simpy import Interrupt
-import math
-from utils import distance
 import numpy as np
+from sinr_engine import SINREngine
+from metrics import NodeAggregates, LiveEnergy, get_ticks
+from event_log import ALLOCATION, FAILURE
 from constants import TIME_MULTIPLIER, TRANSMIT_POWER_FN2VEHICLE, TRANSMIT_POWER_FN2CLOUD
 
 
+class ResourceLedger:
+    """Plain counter of free resource blocks that replaces the SimPy container in ledger mode"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.level = capacity
+
+    def get(self, amount):
+        self.level -= amount
+
+    def put(self, amount):
+        self.level += amount
+
+
+class UrgentCall(Event):
+    """
+    Calls callback right after the current event, the way SimPy starts and
+    interrupts a process. Ledger mode admits and releases services with it
+    at the same point of the schedule as the service processes of container mode
+    """
+
+    def __init__(self, env, callback):
+        self.env = env
+        self.callbacks = [callback]
+        self._value = None
+        self._ok = True
+        env.schedule(self, URGENT)
+
+
 class Node:
     '''A node class that is used to create static nodes in a cloud network'''
 
@@ -15,22 +46,48 @@ class Node:
         '20': 100*100
     }
 
-    def __init__(self, idx, env, coverage_radius, bandwidth, cache_array):
+    def __init__(self, idx, env, coverage_radius, bandwidth, cache_array, ledger=False, aggregates=None, event_log=None):
         self.id = idx
         self.env = env
         self.coverage_radius = coverage_radius
         self.bandwidth = bandwidth
         self.sigma = 0.05
         self.capacity = Node.BADNWIDTH_CAPACITY_MAPPING[str(bandwidth)]
-        self.resource_container = Container(
-            env, capacity=self.capacity, init=self.capacity)
+        # In ledger mode services are served without a SimPy process each
+        self.ledger = ledger
+        if ledger:
+            self.resource_container = ResourceLedger(self.capacity)
+        else:
+            self.resource_container = Container(
+                env, capacity=self.capacity, init=self.capacity)
+        # Totals over all nodes that every change of a counter is pushed to
+        self.aggregates = aggregates if aggregates is not None else NodeAggregates()
+        self.aggregates.capacity += self.capacity
+        self.aggregates.free_resource_blocks += self.capacity
+        # Service events are only recorded when the simulation has an event log
+        self.event_log = event_log
         self._vehicle_services = {}
         self.in_service = False
         self.cache_array = cache_array
         self.overall_throughput = 0
         self.incoming_services = 0
         self.services_served = 0
-        self.energy_consumed = 0
+        self._energy_consumed = 0
+        # Services alive in ledger mode
+        self._live_energy = LiveEnergy()
+        self.sinr_engine = None
+        self._interference = 0
+        self._attached_gains = {}
+        self._channel_gains = {}
+        # Sinr and resource blocks of services, valid until the epoch changes.
+        # Every attach and detach starts an epoch, so a plain run, which reads
+        # a service once when it is allotted and once when it is released,
+        # never hits it; only the observations of the RL envs, which read the
+        # same services many times between two events, do
+        self.epoch = 0
+        self._service_cache = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     def set_position(self, x, y):
         """Sets the position of a fog node"""
@@ -39,8 +96,100 @@ class Node:
     def get_serviceability_metrics(self):
         return (self.services_served, self.incoming_services)
 
+    @property
+    def energy_consumed(self):
+        """Energy consumed by the node including the services that are still alive in ledger mode"""
+        return self._energy_consumed + self._live_energy.get_energy(self.env.now)
+
+    def _get_resources(self, amount):
+        level = self.resource_container.level
+        event = self.resource_container.get(amount)
+        self.aggregates.free_resource_blocks += self.resource_container.level - level
+        return event
+
+    def _put_resources(self, amount):
+        # Gets waiting on the container may complete on a put, so push the whole change of level
+        level = self.resource_container.level
+        event = self.resource_container.put(amount)
+        self.aggregates.free_resource_blocks += self.resource_container.level - level
+        return event
+
+    def _add_throughput(self, service):
+        throughput = self.get_throughput(service)
+        self.overall_throughput += throughput
+        self.aggregates.throughput += throughput
+
+    def _add_served(self):
+        self.services_served += 1
+        self.aggregates.services_served += 1
+
+    def _add_energy(self, energy):
+        self._energy_consumed += energy
+        self.aggregates.energy_consumed += energy
+
+    def _add_live_service(self, power, start):
+        self._live_energy.add(power, start)
+        self.aggregates.live_energy.add(power, start)
+
+    def _remove_live_service(self, power, start):
+        self._live_energy.remove(power, start)
+        self.aggregates.live_energy.remove(power, start)
+
     def _get_channel_gain(self, vehicle):
-        return 1/(distance(self.position, vehicle.get_position())+0.00001)**3.5
+        """Returns the channel gain of the vehicle, cached until the vehicle changes its position"""
+        position = vehicle.get_position()
+        cached = self._channel_gains.get(vehicle.id)
+        if cached is not None and cached[0] == position:
+            return cached[1]
+        gain = SINREngine.get_channel_gain(self.position, position)
+        self._channel_gains[vehicle.id] = (position, gain)
+        return gain
+
+    def get_interference(self, vehicle=None):
+        """Returns the interference from all the services attached to the node except the given vehicle"""
+        if vehicle is not None and vehicle.id in self._attached_gains:
+            return self._interference - SINREngine.INTERFERENCE_FACTOR * \
+                TRANSMIT_POWER_FN2VEHICLE*self._attached_gains[vehicle.id]
+        return self._interference
+
+    def _attach(self, vehicle):
+        """Adds the interference caused by the vehicle to the running total"""
+        self._detach(vehicle.id)
+        gain = self._get_channel_gain(vehicle)
+        self._attached_gains[vehicle.id] = gain
+        self._interference += SINREngine.INTERFERENCE_FACTOR * \
+            TRANSMIT_POWER_FN2VEHICLE*gain
+        self._invalidate()
+
+    def _detach(self, vehicle_id):
+        """Removes the interference caused by the vehicle from the running total"""
+        gain = self._attached_gains.pop(vehicle_id, None)
+        if gain is None:
+            return
+        if self._attached_gains:
+            self._interference -= SINREngine.INTERFERENCE_FACTOR * \
+                TRANSMIT_POWER_FN2VEHICLE*gain
+        else:
+            self._interference = 0
+        self._invalidate()
+
+    def _invalidate(self):
+        """Starts a new epoch as the set of services or their positions have changed"""
+        self.epoch += 1
+        self._service_cache.clear()
+
+    def on_vehicle_moved(self, vehicle):
+        """Updates the interference when an attached vehicle changes its position"""
+        if vehicle.id in self._attached_gains:
+            self._attach(vehicle)
+
+    def forget_vehicle(self, vehicle_id):
+        """Drops the cached channel gain of a vehicle that left the network"""
+        if vehicle_id not in self._attached_gains:
+            self._channel_gains.pop(vehicle_id, None)
+        else:
+            # The service stays but its vehicle is no longer covered by any fog node
+            self._invalidate()
 
     def _get_sinr(self, vehicle):
         """
@@ -50,27 +199,43 @@ class Node:
         # TODO: figure out whether transmit power is 1 kW
         signal = TRANSMIT_POWER_FN2VEHICLE*self._get_channel_gain(vehicle)
         noise = self.sigma**2
-        interference = 0
-        for vehicle_id, obj in self._vehicle_services.items():
-            if vehicle.id != obj["service"].vehicle.id:
-                interference += 0.5 * TRANSMIT_POWER_FN2VEHICLE *\
-                    self._get_channel_gain(obj["service"].vehicle)
-        # print(f'sinr={10*math.log10(signal/(noise+interference))}')
-        return signal/(noise + interference)
+        return signal/(noise + self.get_interference(vehicle))
+
+    def _get_service_entry(self, service):
+        """
+        Returns the cached (sinr, resource blocks) of the service in the current
+        epoch. Entries cannot outlive an attach or detach on the node as those
+        change the interference and so the sinr of every service of the node
+        """
+        position = service.vehicle.get_position()
+        entry = self._service_cache.get(service.id)
+        if entry is not None and entry[0] is service and entry[1] == position:
+            self.cache_hits += 1
+            return entry[2], entry[3]
+        self.cache_misses += 1
+        return self.store_sinr(service, self._get_sinr(service.vehicle))
+
+    def store_sinr(self, service, sinr):
+        """Caches a sinr computed elsewhere for the service and returns (sinr, resource blocks)"""
+        resource_blocks = SINREngine.get_resource_blocks(
+            sinr, service, self.capacity)
+        self._service_cache[service.id] = (
+            service, service.vehicle.get_position(), sinr, resource_blocks)
+        return sinr, resource_blocks
 
     def get_throughput(self, service):
-        return self.bandwidth*self._get_sinr(service.vehicle)
+        return self.bandwidth*self._get_service_entry(service)[0]
 
     def get_resource_blocks(self, service):
         # TODO: return the resource blocks if sinr value is optimal
         # otherwise return the capacity so that service is rejected
-        sinr = self._get_sinr(service.vehicle)
-        spectral_efficiency = math.log2(1+sinr)
-        if spectral_efficiency == 0:
-            return self.capacity
-        return int(service.desired_data_rate * 1000 /
-                   (180*math.log2(1+self._get_sinr(
-                    service.vehicle))))
+        return self._get_service_entry(service)[1]
+
+    def _log_failure(self, service):
+        """Records a service dropped as the node has too few free resource blocks for it"""
+        if self.event_log is not None:
+            self.event_log.log(self.env.now, FAILURE,
+                               service.id, service.vehicle.id, source=self.id)
 
     def _serve_vehicle(self, env, service, migrated=False):
         """Allots some resources to vehicles"""
@@ -88,23 +253,56 @@ class Node:
             #            self.resource_container.level)
             if required_resource_blocks <= self.resource_container.level:
                 if not migrated:
-                    self.services_served += 1
+                    self._add_served()
             else:
                 _ = self._vehicle_services.pop(service.vehicle.id)
-                service.vehicle.allotted_fog_node = None
+                self._detach(service.vehicle.id)
+                service.vehicle.set_allotted_fog_node(None)
+                self._log_failure(service)
                 return
-            yield self.resource_container.get(required_resource_blocks)
+            yield self._get_resources(required_resource_blocks)
             while service.vehicle.id in list(self._vehicle_services.keys()):
                 # For every second add the energy consumed
-                self.energy_consumed += service.curr_power_consumed
+                self._add_energy(service.curr_power_consumed)
                 yield env.timeout(TIME_MULTIPLIER)
         except Interrupt as i:
             # print(
             #     f'Service {service.id} of vehicle {service.vehicle.id} at fog node {self.id} got interrupted.')
             pass
         # Free resources from that vehicle
-        self.overall_throughput += self.get_throughput(service)
-        yield self.resource_container.put(required_resource_blocks)
+        self._add_throughput(service)
+        yield self._put_resources(required_resource_blocks)
+
+    def _allot_resources(self, service, vehicle_service, migrated=False):
+        """Allots resource blocks to the service from the ledger, the same way _serve_vehicle does"""
+        # Minimum resource blocks is 1
+        required_resource_blocks = max(1, self.get_resource_blocks(service))
+        if self._vehicle_services.get(service.vehicle.id) is not vehicle_service:
+            # Then it means service has been migrated before even allotting resource blocks
+            return
+        vehicle_service['resource_blocks'] = required_resource_blocks
+        if required_resource_blocks > self.resource_container.level:
+            _ = self._vehicle_services.pop(service.vehicle.id)
+            self._detach(service.vehicle.id)
+            service.vehicle.set_allotted_fog_node(None)
+            self._log_failure(service)
+            return
+        if not migrated:
+            self._add_served()
+        self._get_resources(required_resource_blocks)
+        vehicle_service['start'] = self.env.now
+        vehicle_service['power'] = service.curr_power_consumed
+        self._add_live_service(vehicle_service['power'], self.env.now)
+
+    def _release_resources(self, service, vehicle_service):
+        """Frees the resource blocks of the service and accounts its energy in closed form"""
+        if 'start' not in vehicle_service:
+            return
+        power, start = vehicle_service['power'], vehicle_service['start']
+        self._add_energy(power*get_ticks(start, self.env.now))
+        self._remove_live_service(power, start)
+        self._add_throughput(service)
+        self._put_resources(vehicle_service['resource_blocks'])
 
     def get_vehicle_services(self):
         return self._vehicle_services
@@ -119,12 +317,21 @@ class Node:
         """Adds a vehicle process to provide services to it"""
         if not migrated:
             self.incoming_services += 1
-        service.vehicle.allotted_fog_node = self
-        print(
-            f"Service {service.id} is assigned to fog node {self.id}")
+            self.aggregates.incoming_services += 1
+        service.vehicle.set_allotted_fog_node(self)
+        if self.event_log is not None and not migrated:
+            self.event_log.log(self.env.now, ALLOCATION,
+                               service.id, service.vehicle.id, target=self.id)
         self.in_service = True
         service.curr_power_consumed = TRANSMIT_POWER_FN2VEHICLE if self.cache_array[
             service.content_type] else (TRANSMIT_POWER_FN2CLOUD + TRANSMIT_POWER_FN2VEHICLE)
+        self._attach(service.vehicle)
+        if self.ledger:
+            vehicle_service = {"service": service}
+            self._vehicle_services[service.vehicle.id] = vehicle_service
+            UrgentCall(self.env, lambda _: self._allot_resources(
+                service, vehicle_service, migrated))
+            return
         self._vehicle_services[service.vehicle.id] = {
             "service": service,
             "process": self.env.process(
@@ -134,7 +341,12 @@ class Node:
     def remove_service(self, service):
         # print(f"Service {service.id} is removed")
         if service is not None:
-            service.vehicle.allotted_fog_node = None
-            self._vehicle_services[service.vehicle.id]["process"].interrupt(
-                'Stopped service')
-            _ = self._vehicle_services.pop(service.vehicle.id)
+            service.vehicle.set_allotted_fog_node(None)
+            if not self.ledger:
+                self._vehicle_services[service.vehicle.id]["process"].interrupt(
+                    'Stopped service')
+            vehicle_service = self._vehicle_services.pop(service.vehicle.id)
+            self._detach(service.vehicle.id)
+            if self.ledger:
+                UrgentCall(self.env, lambda _: self._release_resources(
+                    service, vehicle_service))
@@ -0,0 +1,126 @@
+import json
+import math
+import time
+import numpy as np
+from simpy.events import Process
+
+# Timing histograms have power of two bins starting at a microsecond, the
+# first bin also holds shorter durations and the last one longer durations
+HISTOGRAM_BINS = 32
+HISTOGRAM_START = 1e-6
+
+
+def get_histogram_bin(seconds):
+    """Returns the bin [2^k, 2^(k+1)) microseconds of the duration"""
+    if seconds < 2*HISTOGRAM_START:
+        return 0
+    return min(HISTOGRAM_BINS-1, int(math.log2(seconds/HISTOGRAM_START)))
+
+
+class Timer:
+    """Count, total and maximum of the durations of one kind of operation"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def get_stats(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total/self.count if self.count else 0,
+            "max": self.max,
+        }
+
+
+class Instrumentation:
+    """
+    Counters and timers of the hot paths of a simulation. It is only created
+    when the config enables it, every call site checks for None otherwise
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self.events = 0
+        self.queue_depth_total = 0
+        self.max_queue_depth = 0
+        # Events that resumed a process, by the name of its generator
+        self.process_events = {}
+        self.counters = {}
+        self.timers = {}
+        self.histograms = {}
+        self.pair_histograms = {}
+        self._wall_start = None
+        self._wall_time = 0
+        self._step = env.step
+        # Environment.run calls self.step, so the instance attribute takes over the event loop
+        env.step = self.step
+
+    def step(self):
+        queue = self.env._queue
+        depth = len(queue)
+        self.queue_depth_total += depth
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        if depth:
+            for callback in queue[0][3].callbacks or ():
+                process = getattr(callback, '__self__', None)
+                if isinstance(process, Process):
+                    name = process._generator.__name__
+                    self.process_events[name] = self.process_events.get(
+                        name, 0) + 1
+        if self._wall_start is None:
+            self._wall_start = time.perf_counter()
+        self._step()
+        self.events += 1
+        self._wall_time = time.perf_counter() - self._wall_start
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, name, seconds):
+        """Adds the duration of an operation to its timer and histogram"""
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = Timer()
+            self.histograms[name] = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        timer.record(seconds)
+        self.histograms[name][get_histogram_bin(seconds)] += 1
+
+    def record_pair(self, i, j, seconds):
+        """Adds the duration of the heuristic of a pair of fog nodes"""
+        self.record('dro_pair', seconds)
+        histogram = self.pair_histograms.get((i, j))
+        if histogram is None:
+            histogram = self.pair_histograms[(i, j)] = np.zeros(
+                HISTOGRAM_BINS, dtype=np.int64)
+        histogram[get_histogram_bin(seconds)] += 1
+
+    def get_stats(self):
+        """Returns the counters and timers so far, it can be called while the simulation runs"""
+        return {
+            "events": self.events,
+            "events_per_second": self.events/self._wall_time if self._wall_time else 0,
+            "wall_time": self._wall_time,
+            "queue_depth": len(self.env._queue),
+            "mean_queue_depth": self.queue_depth_total/self.events if self.events else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "process_events": dict(self.process_events),
+            "counters": dict(self.counters),
+            "timers": {name: timer.get_stats() for name, timer in self.timers.items()},
+            "histogram_edges": (HISTOGRAM_START*2.0**np.arange(HISTOGRAM_BINS+1)).tolist(),
+            "histograms": {name: histogram.tolist() for name, histogram in self.histograms.items()},
+            "pair_histograms": {f'{i}-{j}': histogram.tolist()
+                                for (i, j), histogram in self.pair_histograms.items()},
+        }
+
+    def export(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.get_stats(), f, indent=4)
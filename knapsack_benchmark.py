@@ -0,0 +1,40 @@
+import random
+import time
+from optimization_solver import KNAPSACK_SOLVERS
+
+
+def make_instances(count, seed=100):
+    """Random knapsacks shaped like the ones solved by the DRO heuristic"""
+    rng = random.Random(seed)
+    instances = []
+    for _ in range(count):
+        n = rng.randint(1, 60)
+        weights = [rng.randint(1, 500) for _ in range(n)]
+        values = [rng.randint(0, 3000) - w for w in weights]
+        capacity = rng.randint(0, 10000) + sum(rng.sample(weights, n//2))
+        instances.append((weights, values, capacity))
+    return instances
+
+
+def benchmark(backends, instances):
+    results = {}
+    for backend in backends:
+        solver = KNAPSACK_SOLVERS[backend]()
+        start = time.time()
+        selections = [solver.solve(*instance) for instance in instances]
+        results[backend] = (time.time()-start, selections)
+    return results
+
+
+if __name__ == '__main__':
+    instances = make_instances(200)
+    results = benchmark(list(KNAPSACK_SOLVERS), instances)
+    reference = results["ortools"][1]
+    for backend, (elapsed, selections) in results.items():
+        same_selection = sum(s == r for s, r in zip(selections, reference))
+        same_value = sum(
+            sum(values[i] for i in s) == sum(values[i] for i in r)
+            for s, r, (_, values, _) in zip(selections, reference, instances))
+        print(f'{backend:>16}: {1000*elapsed/len(instances):8.3f} ms/solve, '
+              f'same selection as ortools {same_selection}/{len(instances)}, '
+              f'same value {same_value}/{len(instances)}')
@@ -1,9 +1,10 @@
+import argparse
 import random
 from gym import Env, spaces
 import numpy as np
 from gym.utils import seeding
 from stable_baselines.common.policies import FeedForwardPolicy, register_policy
-from stable_baselines.common.vec_env import DummyVecEnv
+from stable_baselines.common.vec_env import DummyVecEnv, VecEnv
 
 from stable_baselines import PPO2, A2C
 import tensorflow as tf
@@ -126,15 +127,151 @@ class KPEnv(Env):
         return [seed]
 
 
+class BatchedKPEnv(VecEnv):
+    """
+    Steps B independent KPEnv instances at once on arrays. Picked items are
+    removed by shifting the items behind them, so the observations are the
+    same as the ones of KPEnv
+    """
+
+    def __init__(self, num_envs, seed=None):
+        self.N = 20
+        self.R = self.N*2
+        super().__init__(num_envs,
+                         spaces.Box(low=-np.inf, high=np.inf,
+                                    shape=(6*self.N+9,), dtype=np.float32),
+                         spaces.MultiDiscrete([self.N, 2]))
+        self.np_random = np.random.RandomState(seed)
+        # [n, c1, c2, sv1, sv2, sw1, sw2, sc1, sc2] of every instance
+        self.header = np.zeros((num_envs, 9))
+        # (value, weight, cache) of every item for both knapsacks
+        self.items = np.zeros((num_envs, self.N, 6))
+        self.rewards = np.zeros(num_envs)
+        self.actions = None
+        self._reset_instances(np.arange(num_envs))
+
+    def _reset_instances(self, rows):
+        """Draws new instances with the distribution of KPEnv.reset"""
+        size = (len(rows), self.N)
+        val1 = self.np_random.randint(-self.R, 0, size=size)
+        val2 = self.np_random.randint(-self.R, 0, size=size)
+        cac1 = self.np_random.randint(0, 2, size=size)
+        cac2 = self.np_random.randint(0, 2, size=size)
+        c = self.np_random.randint(self.R//10, 3*self.R+1, size=(len(rows), 2))
+        # KPEnv observes the cache flags of the first knapsack for both
+        self.items[rows] = np.stack(
+            [val1, -val1, cac1, val2, -val2, cac1], axis=2)
+        self.header[rows] = np.column_stack([
+            np.full(len(rows), self.N), c, -val1.sum(1), -val2.sum(1),
+            -val1.sum(1), -val2.sum(1), cac1.sum(1), cac2.sum(1)])
+        self.rewards[rows] = 0
+
+    def _observe(self):
+        return np.concatenate([self.header, self.items.reshape(self.num_envs, -1)],
+                              axis=1).astype(np.float32)
+
+    def reset(self):
+        self._reset_instances(np.arange(self.num_envs))
+        return self._observe()
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions)
+
+    def step_wait(self):
+        rows = np.arange(self.num_envs)
+        picked = self.actions[:, 0]
+        flag = self.actions[:, 1]
+        item = picked+1
+        n = self.header[:, 0].copy()
+        obj = self.items[rows, picked]
+        v = obj[rows, 3*flag]
+        w = obj[rows, 3*flag+1]
+        cache = obj[rows, 3*flag+2]
+        c = self.header[rows, 1+flag]
+        valid = item <= n
+        fits = w <= c
+        rewards = np.where(
+            valid,
+            np.where(fits, np.maximum(0, self.R+v+np.where(cache == 1, 10, -10)), -w),
+            -100*np.power(1.2, item-n))
+        self.rewards += rewards
+        # The picked item is consumed even when it does not fit
+        self.header[rows[valid], 1+flag[valid]] -= w[valid]
+        update = np.column_stack([
+            -np.ones(self.num_envs), np.zeros((self.num_envs, 2)),
+            obj[:, 0], obj[:, 3], -obj[:, 1], -obj[:, 4], -obj[:, 2], -obj[:, 5]])
+        self.header[valid] += update[valid]
+        # Shift the items behind the picked one to the front and pad with zeros
+        positions = np.arange(self.N)
+        source = positions + (valid[:, None] & (positions >= picked[:, None]))
+        padding = source >= self.N
+        self.items = self.items[rows[:, None], np.minimum(source, self.N-1)]
+        self.items[padding] = 0
+        c1 = self.header[:, 1]
+        c2 = self.header[:, 2]
+        dones = ~(((c1 >= 0) | (c2 >= 0)) & (n > 1))
+        infos = [{} for _ in rows]
+        finished = np.nonzero(dones)[0]
+        if len(finished):
+            observations = self._observe()
+            for row in finished:
+                infos[row] = {"terminal_observation": observations[row],
+                              "episode_reward": self.rewards[row]}
+            self._reset_instances(finished)
+        return self._observe(), rewards, dones, infos
+
+    def close(self):
+        pass
+
+    def seed(self, seed=None):
+        self.np_random = np.random.RandomState(seed)
+        return [seed]*self.num_envs
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name)]*len(self._get_indices(indices))
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result]*len(self._get_indices(indices))
+
+    def _get_indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+
 class CustomPolicy(FeedForwardPolicy):
     def __init__(self, *args, **kwargs):
         super(CustomPolicy, self).__init__(*args, **kwargs,
                                            net_arch=[256, 256], feature_extraction='mlp')
 
 
-# env = KPEnv()
-# env = DummyVecEnv([lambda: env])
-# model = A2C(CustomPolicy, env, verbose=1)
-# model.learn(total_timesteps=200000)
-# model.save('omsr_power_final_2')
-# #
+def train(batch_size=1, total_timesteps=200000, path='omsr_power_final_2'):
+    """
+    Trains the A2C policy of the RL orchestration. With a batch_size above 1
+    every step of A2C steps batch_size knapsack instances of a BatchedKPEnv
+    """
+    if batch_size > 1:
+        env = BatchedKPEnv(batch_size)
+    else:
+        env = DummyVecEnv([KPEnv])
+    model = A2C(CustomPolicy, env, verbose=1)
+    model.learn(total_timesteps=total_timesteps)
+    model.save(path)
+    return model
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Trains the A2C policy used by the RL orchestration scheme')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='knapsack instances stepped at once, see kp_env_benchmark.py')
+    parser.add_argument('--timesteps', type=int, default=200000)
+    parser.add_argument('--output', default='omsr_power_final_2')
+    args = parser.parse_args()
+    train(args.batch_size, args.timesteps, args.output)
@@ -0,0 +1,48 @@
+import argparse
+import time
+import numpy as np
+from kp_env import KPEnv, BatchedKPEnv
+
+
+def random_actions(rng, count, items):
+    return np.column_stack([rng.randint(0, items, count), rng.randint(0, 2, count)])
+
+
+def benchmark_kp_env(steps, seed=100):
+    """Returns the env steps per second of KPEnv, reset at the end of every episode like DummyVecEnv"""
+    env = KPEnv()
+    actions = random_actions(np.random.RandomState(seed), steps, env.N)
+    start = time.time()
+    for action in actions:
+        _, _, done, _ = env.step(action)
+        if done:
+            env.reset()
+    return steps/(time.time()-start)
+
+
+def benchmark_batched_kp_env(batch_size, steps, seed=100):
+    """Returns the env steps per second of a BatchedKPEnv of batch_size instances"""
+    env = BatchedKPEnv(batch_size, seed=seed)
+    env.reset()
+    rng = np.random.RandomState(seed)
+    batches = [random_actions(rng, batch_size, env.N)
+               for _ in range(max(1, steps//batch_size))]
+    start = time.time()
+    for actions in batches:
+        env.step(actions)
+    return len(batches)*batch_size/(time.time()-start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compares the env steps per second of KPEnv and BatchedKPEnv')
+    parser.add_argument('--steps', type=int, default=100000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+',
+                        default=[16, 64, 256, 1024])
+    args = parser.parse_args()
+    reference = benchmark_kp_env(args.steps)
+    print(f'{"KPEnv":>20}: {reference:12.0f} steps/s')
+    for batch_size in args.batch_sizes:
+        rate = benchmark_batched_kp_env(batch_size, args.steps)
+        print(f'{f"BatchedKPEnv({batch_size})":>20}: {rate:12.0f} steps/s, '
+              f'{rate/reference:6.1f}x KPEnv')
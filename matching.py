@@ -0,0 +1,52 @@
+import heapq
+
+
+class PairMatching:
+    """Selects disjoint pairs of fog nodes from the weighted pair graph"""
+
+    def match(self, W):
+        """Takes the weights keyed by pairs of fog node ids and outputs the set of selected pairs"""
+        raise NotImplementedError
+
+
+class GreedyMatching(PairMatching):
+    """
+    Repeatedly takes the heaviest pair whose fog nodes are both unmatched, ties
+    go to the pair that was added to W first
+    """
+
+    def match(self, W):
+        heap = [(-weight, order, edge)
+                for order, (edge, weight) in enumerate(W.items())]
+        heapq.heapify(heap)
+        matched = set()
+        phi = set()
+        while heap:
+            _, _, edge = heapq.heappop(heap)
+            if edge[0] in matched or edge[1] in matched:
+                continue
+            phi.add(edge)
+            matched.update(edge)
+        return phi
+
+
+class BlossomMatching(PairMatching):
+    """Exact maximum weight matching with Edmonds' blossom algorithm, pairs without gain are left out"""
+
+    def match(self, W):
+        import networkx as nx
+        graph = nx.Graph()
+        for (i, j), weight in W.items():
+            if weight > 0:
+                graph.add_edge(i, j, weight=weight)
+        phi = set()
+        for i, j in nx.max_weight_matching(graph):
+            edge = (i, j) if (i, j) in W else (j, i)
+            phi.add(edge)
+        return phi
+
+
+MATCHING_ALGORITHMS = {
+    "greedy": GreedyMatching,
+    "blossom": BlossomMatching,
+}
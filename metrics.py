@@ -1,16 +1,77 @@
+import math
 import time
+import numpy as np
+from constants import TIME_MULTIPLIER
 
 
-class Metric:
+def get_ticks(start, now):
+    """
+    Returns the number of times the service process of container mode has
+    charged the power of a service that started at start by time now. It
+    charges once the resource blocks are got, right after the other events
+    at the start time, and then after every TIME_MULTIPLIER the service stays
+    """
+    return math.ceil((now-start)/TIME_MULTIPLIER - 1e-9)
+
+
+class LiveEnergy:
+    """
+    Energy of the services alive in ledger mode, see get_ticks. Services are
+    grouped by their start time modulo TIME_MULTIPLIER, as the services of a
+    group are charged at the same times
+    """
 
     def __init__(self):
-        self._values = []
+        # phase -> [services, sum of power, sum of power*periods before the start]
+        self.phases = {}
+
+    def add(self, power, start):
+        periods, phase = divmod(start, TIME_MULTIPLIER)
+        group = self.phases.setdefault(phase, [0, 0, 0])
+        group[0] += 1
+        group[1] += power
+        group[2] += power*periods
+
+    def remove(self, power, start):
+        periods, phase = divmod(start, TIME_MULTIPLIER)
+        group = self.phases[phase]
+        group[0] -= 1
+        group[1] -= power
+        group[2] -= power*periods
+        if group[0] == 0:
+            del self.phases[phase]
+
+    def get_energy(self, now):
+        return sum(power*get_ticks(phase, now) - power_periods
+                   for phase, (_, power, power_periods) in self.phases.items())
+
+
+class NodeAggregates:
+    """
+    Running totals over all fog nodes. Nodes push the change of every counter
+    as it happens so that metrics never have to walk the nodes
+    """
 
-    def compute(self, nodes):
-        raise NotImplementedError
+    def __init__(self):
+        self.capacity = 0
+        self.free_resource_blocks = 0
+        self.throughput = 0
+        self.services_served = 0
+        self.incoming_services = 0
+        self.energy_consumed = 0
+        # Services alive in ledger mode
+        self.live_energy = LiveEnergy()
+
+    def get_energy_consumed(self, now):
+        """Energy consumed by all nodes including the services that are still alive in ledger mode"""
+        return self.energy_consumed + self.live_energy.get_energy(now)
 
-    def get_values(self):
-        return self._values
+
+class Metric:
+
+    def derive(self, totals):
+        """Returns the value of the metric from the totals of a tick"""
+        raise NotImplementedError
 
 
 class ServiceCapability(Metric):
@@ -18,91 +79,56 @@ class ServiceCapability(Metric):
 
     def __init__(self):
         self.name = 'service_capability'
-        super().__init__()
 
-    def compute(self, nodes):
-        self._values.append(sum(
-            [node.resource_container.level for node in nodes]
-        )/sum([node.capacity for node in nodes]))
+    def derive(self, totals):
+        return totals.free_resource_blocks/totals.capacity
 
 
 class Throughput(Metric):
 
     def __init__(self):
         self.name = 'throughput'
-        super().__init__()
 
-    def compute(self, nodes):
-        self._values.append(sum([node.overall_throughput for node in nodes]))
+    def derive(self, totals):
+        return totals.throughput
 
 
 class Serviceability(Metric):
 
     def __init__(self):
         self.name = 'serviceability'
-        super().__init__()
-
-    def compute(self, nodes):
-        tis = 0
-        tss = 0
-        for node in nodes:
-            x, y = node.get_serviceability_metrics()
-            tss += x
-            tis += y
-        if tis == 0:
-            self._values.append(1)
-        else:
-            self._values.append(tss /
-                                tis)
-
-
-class Availability(Metric):
+
+    def derive(self, totals):
+        if totals.incoming_services == 0:
+            return 1
+        return totals.services_served/totals.incoming_services
+
+
+class Availability(Serviceability):
     # TODO: Compute this metric by using the minimum data rate for all services
 
     def __init__(self):
         self.name = 'availability'
-        super().__init__()
-
-    def compute(self, nodes):
-        tis = 0
-        tss = 0
-        for node in nodes:
-            x, y = node.get_serviceability_metrics()
-            tss += x
-            tis += y
-
-        if tis == 0:
-            self._values.append(1)
-        else:
-            self._values.append(tss /
-                                tis)
 
 
 class AVGEnergyConsumed(Metric):
 
     def __init__(self):
         self.name = 'avg_energy_consumed'
-        super().__init__()
 
-    def compute(self, nodes):
-        tss = sum([node.get_serviceability_metrics()[0] for node in nodes])
-        total_energy = sum([node.energy_consumed for node in nodes])
-        # self._values.append(total_energy)
-        if tss == 0:
-            self._values.append(total_energy)
-        else:
-            self._values.append(total_energy/tss)
+    def derive(self, totals):
+        if totals.services_served == 0:
+            return totals.energy_consumed
+        return totals.energy_consumed/totals.services_served
 
 
 class EnergyConsumed(Metric):
 
     def __init__(self):
         self.name = 'energy_consumed'
-        super().__init__()
 
-    def compute(self, nodes):
-        total_energy = sum([node.energy_consumed for node in nodes])
-        self._values.append(total_energy)
+    def derive(self, totals):
+        return totals.energy_consumed
 
 
 class ExecTime(Metric):
@@ -110,10 +136,56 @@ class ExecTime(Metric):
     def __init__(self):
         self.name = 'execution_time'
         self.start = time.time()
-        super().__init__()
 
-    def compute(self, nodes):
-        self._values.append(time.time()-self.start)
+    def derive(self, totals):
+        return time.time()-self.start
+
+
+class TickTotals:
+    """Totals of a single tick read once and shared by all the metrics"""
+
+    def __init__(self, aggregates, now):
+        self.capacity = aggregates.capacity
+        self.free_resource_blocks = aggregates.free_resource_blocks
+        self.throughput = aggregates.throughput
+        self.services_served = aggregates.services_served
+        self.incoming_services = aggregates.incoming_services
+        self.energy_consumed = aggregates.get_energy_consumed(now)
+
+
+class MetricsEngine:
+    """
+    Derives all the configured metrics from the node aggregates in one step
+    per tick and stores them in a growable array with a row per metric
+    """
+
+    def __init__(self, metric_types, aggregates, env, capacity=256):
+        self.metrics = [MetricFactory(metric_type)
+                        for metric_type in metric_types]
+        self.aggregates = aggregates
+        self.env = env
+        self._values = np.empty((len(self.metrics), capacity))
+        self._count = 0
+
+    def compute(self):
+        if self._count == self._values.shape[1]:
+            values = np.empty((len(self.metrics), 2*self._values.shape[1]))
+            values[:, :self._count] = self._values
+            self._values = values
+        totals = TickTotals(self.aggregates, self.env.now)
+        for row, metric in enumerate(self.metrics):
+            self._values[row, self._count] = metric.derive(totals)
+        self._count += 1
+
+    def get_values(self, name):
+        for row, metric in enumerate(self.metrics):
+            if metric.name == name:
+                return self._values[row, :self._count]
+        raise KeyError(name)
+
+    def get_metrics(self):
+        return {metric.name: self._values[row, :self._count].tolist()
+                for row, metric in enumerate(self.metrics)}
 
 
 def MetricFactory(metric_type):
@@ -1,15 +1,58 @@
 from abc import ABC
-import pandas as pd
-from vehicle import Vehicle
+from vehicle import Vehicle, VehicleTable
+from trace_cache import load_trace
 import numpy as np
 import random
+from constants import TIME_MULTIPLIER
 
 
 class MobiltyModel(ABC):
+    """Moves the whole fleet of vehicles from a single SimPy process"""
 
-    def positions(self):
-        """Generator function that returns the next position of the vehicle"""
-        pass
+    # Stationary models never move a vehicle after it arrives
+    stationary = False
+
+    def __init__(self, config):
+        self.config = config
+        self.vehicles = {}
+        self.vehicle_table = VehicleTable()
+        self.listeners = []
+        self.resolution = config.get(
+            "mobility_resolution", 0.1*TIME_MULTIPLIER)
+
+    def start(self, env):
+        """Starts the process that advances the positions of all vehicles"""
+        if not self.stationary:
+            env.process(self._move_fleet(env))
+
+    def _move_fleet(self, env):
+        while True:
+            for vehicle in self.advance(env.now):
+                self.notify_moved(vehicle)
+            yield env.timeout(self.resolution)
+
+    def advance(self, now):
+        """Moves the vehicles to their positions at time now and returns the vehicles that moved"""
+        raise NotImplementedError
+
+    def add_listener(self, listener):
+        """Registers a listener that is notified when vehicles move or leave the network"""
+        self.listeners.append(listener)
+
+    def notify_moved(self, vehicle):
+        for listener in self.listeners:
+            listener.on_vehicle_moved(vehicle)
+
+    def notify_departed(self, vehicle):
+        vehicle.in_network = False
+        rows = self.vehicle_table.remove_row(vehicle)
+        if rows is not None:
+            self.on_table_compacted(rows)
+        for listener in self.listeners:
+            listener.on_vehicle_departed(vehicle)
+
+    def on_table_compacted(self, rows):
+        """Called with the new row of every old row of the vehicle table after it dropped the rows of departed vehicles"""
 
 
 # TODO: Create a factory class that takes config as param
@@ -17,52 +60,124 @@ class MobiltyModel(ABC):
 
 class DynamicMobilityModel(MobiltyModel):
 
+    # Time between two consecutive frames of the trace
+    FRAME_PERIOD = 0.1*TIME_MULTIPLIER
+
     def __init__(self, file_path, config):
         """Takes a mobility dataset and generates vehicles positions"""
-        self.df = pd.read_csv(file_path)
-        self.trajectory = None
-        self.config = config
-        self.vehicles = {}
+        super().__init__(config)
+        trace = load_trace(file_path, config.get("trace_cache_dir"))
+        self._index_trace(trace["Frame_ID"], trace["Vehicle_ID"],
+                          trace["Global_X"], trace["Global_Y"], trace["Row"])
+        self._fleet = []
+        self._rows = np.empty(0, dtype=int)
+        self._offsets = np.empty(0, dtype=int)
+        self._lengths = np.empty(0, dtype=int)
+        self._arrivals = np.empty(0)
+        self._cursors = np.empty(0, dtype=int)
+
+    def _index_trace(self, frame_ids, vehicle_ids, xs, ys, rows):
+        """Groups the trace once into per frame arrivals and per vehicle trajectories"""
+        # Trajectories of all vehicles are stored one after another, sorted by
+        # frame, and each vehicle reads its rows from its offset. Cached traces
+        # are already in this order so the positions stay memory mapped
+        if not (np.all(vehicle_ids[1:] >= vehicle_ids[:-1]) and
+                np.all((vehicle_ids[1:] > vehicle_ids[:-1]) | (frame_ids[1:] >= frame_ids[:-1]))):
+            order = np.lexsort((frame_ids, vehicle_ids))
+            frame_ids, vehicle_ids, xs, ys, rows = (
+                column[order] for column in (frame_ids, vehicle_ids, xs, ys, rows))
+        self._x = xs
+        self._y = ys
+        offsets = np.flatnonzero(
+            np.concatenate(([True], vehicle_ids[1:] != vehicle_ids[:-1])))
+        lengths = np.diff(np.append(offsets, len(vehicle_ids)))
+        self._trajectories = {vehicle_id: (offset, length) for vehicle_id, offset, length in zip(
+            vehicle_ids[offsets].tolist(), offsets.tolist(), lengths.tolist())}
+        # Vehicles present in every frame in the order of the original trace
+        order = np.lexsort((rows, frame_ids))
+        frame_ids = frame_ids[order]
+        starts = np.flatnonzero(
+            np.concatenate(([True], frame_ids[1:] != frame_ids[:-1])))
+        self._frame_vehicles = {frame_id: list(dict.fromkeys(vehicles.tolist())) for frame_id, vehicles in zip(
+            frame_ids[starts].tolist(), np.split(vehicle_ids[order], starts[1:]))}
 
     def update_vehicles(self, env, frame_id):
-        df = self.df[self.df["Frame_ID"] == frame_id]
-        df = df[~df["Vehicle_ID"].isin(self.vehicles.keys())]["Vehicle_ID"]
-        for _, idx in df.items():
+        arrived = []
+        for idx in self._frame_vehicles.get(frame_id, ()):
+            if idx in self.vehicles:
+                continue
             v = Vehicle(
                 idx,
                 env,
                 self.config["desired_data_rate"],
+                self.vehicle_table,
             )
             v.set_mobility_model(self)
             self.vehicles[idx] = v
-
-    def positions(self, vehicle):
+            arrived.append(v)
+        if arrived:
+            self._add_to_fleet(arrived, env.now)
+
+    def on_table_compacted(self, rows):
+        # Rows of the vehicles that departed in the same advance become -1 and are dropped with them
+        self._rows = rows[self._rows]
+
+    def _add_to_fleet(self, vehicles, now):
+        offsets, lengths = np.array(
+            [self._trajectories[vehicle.id] for vehicle in vehicles], dtype=int).T
+        self._fleet.extend(vehicles)
+        self._rows = np.concatenate(
+            (self._rows, [vehicle.row for vehicle in vehicles]))
+        self._offsets = np.concatenate((self._offsets, offsets))
+        self._lengths = np.concatenate((self._lengths, lengths))
+        self._arrivals = np.concatenate((self._arrivals, np.full(len(vehicles), now)))
+        self._cursors = np.concatenate((self._cursors, np.zeros(len(vehicles), dtype=int)))
+        self.vehicle_table.positions[self._rows[-len(vehicles):]] = np.column_stack(
+            (self._x[offsets], self._y[offsets]))
+        for vehicle in vehicles:
+            self.notify_moved(vehicle)
+
+    def advance(self, now):
         """
-        Starts with first position in the data and yield position
+        Starts with first position in the data and moves every vehicle to the
+        frame reached at time now. Vehicles at the end of their trajectory leave
         """
-        self.trajectory = self.df[self.df["Vehicle_ID"]
-                                  == vehicle.id].sort_values(by="Frame_ID")
-        cur_idx = 0
-        while True:
-            try:
-                position = (
-                    self.trajectory.iloc[cur_idx]["Global_X"], self.trajectory.iloc[cur_idx]["Global_Y"])
-                cur_idx += 1
-            except IndexError:
-                v = self.vehicles.pop(vehicle.id)
-                del v
-                yield (-1, -1)
-                break
-
-            yield position
+        if not self._fleet:
+            return []
+        cursors = np.floor((now-self._arrivals) /
+                           self.FRAME_PERIOD + 1e-9).astype(int)
+        ended = cursors >= self._lengths
+        changed = np.nonzero(~ended & (cursors != self._cursors))[0]
+        frames = self._offsets[changed] + cursors[changed]
+        self.vehicle_table.positions[self._rows[changed]] = np.column_stack(
+            (self._x[frames], self._y[frames]))
+        moved = [self._fleet[k] for k in changed]
+        for k in np.nonzero(ended)[0]:
+            vehicle = self._fleet[k]
+            v = self.vehicles.pop(vehicle.id)
+            self.notify_departed(v)
+            vehicle.set_position((-1, -1))
+            moved.append(vehicle)
+        self._cursors = cursors
+        if ended.any():
+            keep = ~ended
+            self._fleet = [vehicle for vehicle, kept in zip(
+                self._fleet, keep) if kept]
+            self._rows = self._rows[keep]
+            self._offsets = self._offsets[keep]
+            self._lengths = self._lengths[keep]
+            self._arrivals = self._arrivals[keep]
+            self._cursors = self._cursors[keep]
+        return moved
 
 
 class StaticSimulatedMobilityModel(MobiltyModel):
 
+    stationary = True
+
     def __init__(self, config):
         """Takes a mobility dataset and generates vehicles positions"""
-        self.config = config
-        self.vehicles = {}
+        super().__init__(config)
         self.pos = {}
         self.mxidx = 0
 
@@ -74,30 +189,27 @@ class StaticSimulatedMobilityModel(MobiltyModel):
                 idx = random.choice(list(self.vehicles.keys()))
                 v = self.vehicles.pop(idx)
                 # self.pos.pop(idx)
+                self.notify_departed(v)
                 del v
         for i in range(arr_vehicles):
             v = Vehicle(
                 self.mxidx,
                 env,
                 self.config["desired_data_rate"],
+                self.vehicle_table,
             )
             v.set_mobility_model(self)
             self.vehicles[self.mxidx] = v
             self.mxidx += 1
+            v.set_position(self.initial_position())
+            self.notify_moved(v)
 
-    def positions(self, vehicle):
-        """
-        Starts with first position in the data and yield position
-        """
-
+    def initial_position(self):
+        """Returns a random position in the network area where the vehicle stays"""
         na = self.config['network_area']
         origin = self.config['topology_origin']
-        pos = (origin[0]+random.randint(
+        return (origin[0]+random.randint(
             0, na[0]), origin[1]+random.randint(0, na[1]))
-        while True:
-            try:
-                position = pos
-            except IndexError:
-                yield (-1, -1)
 
-            yield position
+    def advance(self, now):
+        return []
@@ -0,0 +1,136 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+import warnings
+import numpy as np
+from results_archive import ResultsArchive
+
+# Two sided 95% confidence interval of the mean under the normal approximation
+CI_Z = 1.96
+PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def get_config_path(config):
+    """Takes the name of a config in ./configs or a path to a config file"""
+    return config if config.endswith('.json') else f'./configs/{config}.json'
+
+
+def run_simulation(args):
+    """Runs one simulation of the config with the seed and returns its metrics"""
+    config, seed = args
+    from simulation import Simulation
+    random.seed(seed)
+    np.random.seed(seed)
+    start = time.time()
+    # Runs of the sweep write the output files of the config side by side
+    s = Simulation(config=get_config_path(config),
+                   run_id=f'{os.path.splitext(os.path.basename(config))[0]}_{seed}')
+    s.run()
+    return {"config": config, "seed": seed, "wall_time": time.time()-start,
+            "metrics": s.get_metrics()}
+
+
+def load_runs(runs_path):
+    """Returns the runs already written to the runs file"""
+    runs = []
+    if os.path.exists(runs_path):
+        with open(runs_path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    runs.append(json.loads(line))
+    return runs
+
+
+def aggregate(series):
+    """
+    Aggregates metric series of different lengths, the statistics at every
+    time step only use the runs that lasted that long
+    """
+    length = max((len(values) for values in series), default=0)
+    values = np.full((len(series), length), np.nan)
+    for row, s in enumerate(series):
+        values[row, :len(s)] = s
+    count = np.sum(~np.isnan(values), axis=0)
+    mean = np.nanmean(values, axis=0)
+    with warnings.catch_warnings():
+        # The spread of time steps reached by a single run is undefined and left at 0
+        warnings.simplefilter('ignore', RuntimeWarning)
+        std = np.nanstd(values, axis=0, ddof=1)
+    half_width = CI_Z*np.nan_to_num(std)/np.sqrt(count)
+    result = {
+        "count": count.tolist(),
+        "mean": mean.tolist(),
+        "ci_low": (mean-half_width).tolist(),
+        "ci_high": (mean+half_width).tolist(),
+    }
+    percentiles = np.nanpercentile(values, PERCENTILES, axis=0)
+    for p, row in zip(PERCENTILES, percentiles):
+        result[f"p{p}"] = row.tolist()
+    return result
+
+
+def summarize(runs):
+    """Returns config -> metric -> statistics over all the seeds of the config"""
+    by_config = {}
+    for run in runs:
+        by_config.setdefault(run["config"], []).append(run["metrics"])
+    summary = {}
+    for config, metrics in by_config.items():
+        summary[config] = {name: aggregate([m[name] for m in metrics])
+                           for name in metrics[0]}
+        summary[config]["runs"] = len(metrics)
+    return summary
+
+
+def run_monte_carlo(configs, seeds, output_dir='./monte_carlo', workers=None, archive_path=None):
+    """
+    Runs every config with every seed in a process pool. Every finished run is
+    appended to runs.jsonl right away, runs found there are not repeated, and
+    the aggregated statistics are written to summary.json at the end. New runs
+    are also appended to the results archive at archive_path if given
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    runs_path = os.path.join(output_dir, 'runs.jsonl')
+    runs = load_runs(runs_path)
+    done = {(run["config"], run["seed"]) for run in runs}
+    tasks = [(config, seed) for config in configs for seed in seeds
+             if (config, seed) not in done]
+    if tasks:
+        ctx = multiprocessing.get_context("fork")
+        archive = ResultsArchive(archive_path) if archive_path else None
+        with ctx.Pool(workers or os.cpu_count()) as pool, open(runs_path, 'a') as f:
+            for finished, run in enumerate(pool.imap_unordered(run_simulation, tasks), 1):
+                f.write(json.dumps(run)+'\n')
+                f.flush()
+                if archive:
+                    archive.append(run["config"], run["seed"], run["metrics"])
+                runs.append(run)
+                print(f'Finished {run["config"]} with seed {run["seed"]} '
+                      f'in {run["wall_time"]:.1f}s ({finished}/{len(tasks)})')
+        if archive:
+            archive.close()
+    runs = [run for run in runs if run["config"] in configs and run["seed"] in seeds]
+    summary = summarize(runs)
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f)
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Runs Monte Carlo simulations of configs over a range of seeds')
+    parser.add_argument('configs', nargs='+',
+                        help='names of configs in ./configs or paths to config files')
+    parser.add_argument('--seeds', type=int, nargs=2, default=[0, 100],
+                        metavar=('START', 'STOP'), help='range of seeds, stop excluded')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output-dir', default='./monte_carlo')
+    parser.add_argument('--archive', default=None,
+                        help='directory of a results archive to append the runs to')
+    args = parser.parse_args()
+    run_monte_carlo(args.configs, list(range(*args.seeds)),
+                    args.output_dir, args.workers, args.archive)
@@ -1,39 +1,37 @@
-from ortools.linear_solver import pywraplp
-
-# class OptimizationSolver:
-#     """By default it's knapsack solver"""
-
-#     def solve(self, weights, values, capacity):
-#         """Takes the parameters and outputs the indices of items that are selected"""
-#         n = len(values)
-#         dp = [[0 for i in range(capacity+1)] for j in range(n+1)]
-#         for i in range(1, n+1):
-#             for w in range(1, capacity+1):
-#                 if weights[i-1] <= w and values[i-1] > 0:
-#                     dp[i][w] = max(dp[i-1][w], values[i-1] +
-#                                    dp[i-1][w-weights[i-1]])
-#                 else:
-#                     dp[i][w] = dp[i-1][w]
-#         selected_items = set()
-#         weight_in_knapsack = capacity
-#         total_value = dp[n][capacity]
-#         for i in range(n, 0, -1):
-#             if total_value < 0:
-#                 break
-#             # If total value is more than the value of the items knapsack
-#             # include the ith item in selected items
-#             if total_value != dp[i-1][weight_in_knapsack]:
-#                 selected_items.add(i-1)
-#                 total_value -= values[i-1]
-#                 weight_in_knapsack -= weights[i-1]
-#         return selected_items
+import numpy as np
+from registry import Registry
 
 
-class OptimizationSolver:
-    """By default it's knapsack solver"""
+class KnapsackSolver:
+    """Solves a 0/1 knapsack problem"""
 
     def solve(self, weights, values, capacity):
         """Takes the parameters and outputs the indices of items that are selected"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _split_items(weights, values, capacity):
+        """
+        Returns the items that are always selected (free and profitable) and
+        the items that still have to be decided by the solver
+        """
+        free = set()
+        items = []
+        for i in range(len(values)):
+            if values[i] <= 0 or weights[i] > capacity:
+                continue
+            if weights[i] <= 0:
+                free.add(i)
+            else:
+                items.append(i)
+        return free, items
+
+
+class ORToolsKnapsackSolver(KnapsackSolver):
+    """Builds a MIP model and solves it with CBC"""
+
+    def solve(self, weights, values, capacity):
+        from ortools.linear_solver import pywraplp
         solver = pywraplp.Solver('knapsack_solver',pywraplp.Solver.CBC_MIXED_INTEGER_PROGRAMMING)
         n = len(values)
         x = {}
@@ -53,6 +51,103 @@ class OptimizationSolver:
         for i in range(n):
             if x[i].solution_value()==1:
                 selected_items.add(i)
-        
+
+        return selected_items
+
+
+class DPKnapsackSolver(KnapsackSolver):
+    """Dynamic programming over the capacity, requires integer weights"""
+
+    def solve(self, weights, values, capacity):
+        selected_items, items = self._split_items(weights, values, capacity)
+        if not items:
+            return selected_items
+        capacity = int(capacity)
+        # dp[w] is the best value of the items seen so far with capacity w
+        dp = np.zeros(capacity+1)
+        taken = np.zeros((len(items), capacity+1), dtype=bool)
+        for k, i in enumerate(items):
+            w = int(weights[i])
+            candidate = dp[:capacity+1-w] + values[i]
+            better = candidate > dp[w:]
+            taken[k, w:] = better
+            dp[w:] = np.where(better, candidate, dp[w:])
+        weight_in_knapsack = capacity
+        for k in range(len(items)-1, -1, -1):
+            if taken[k, weight_in_knapsack]:
+                selected_items.add(items[k])
+                weight_in_knapsack -= int(weights[items[k]])
+        return selected_items
+
+
+class BranchAndBoundKnapsackSolver(KnapsackSolver):
+    """Depth first branch and bound with the fractional relaxation as bound, independent of the capacity"""
+
+    def solve(self, weights, values, capacity):
+        selected_items, items = self._split_items(weights, values, capacity)
+        items.sort(key=lambda i: values[i]/weights[i], reverse=True)
+        n = len(items)
+
+        def bound(k, room):
+            value = 0
+            for i in items[k:]:
+                if weights[i] <= room:
+                    room -= weights[i]
+                    value += values[i]
+                else:
+                    return value + values[i]*room/weights[i]
+            return value
+
+        best_value = 0
+        best = ()
+        stack = [(0, 0, capacity, ())]
+        while stack:
+            k, value, room, chosen = stack.pop()
+            if value > best_value:
+                best_value, best = value, chosen
+            if k == n or value + bound(k, room) <= best_value:
+                continue
+            i = items[k]
+            stack.append((k+1, value, room, chosen))
+            # Explore the branch that takes the item first
+            if weights[i] <= room:
+                stack.append((k+1, value+values[i], room-weights[i], chosen+(i,)))
+        selected_items.update(best)
         return selected_items
-        
\ No newline at end of file
+
+
+class NativeKnapsackSolver(KnapsackSolver):
+    """Uses dynamic programming for integer weights and branch and bound for large capacities"""
+
+    # Largest items x capacity table the dynamic programming solver builds
+    MAX_DP_CELLS = 10**5
+
+    def __init__(self):
+        self.dp = DPKnapsackSolver()
+        self.branch_and_bound = BranchAndBoundKnapsackSolver()
+
+    def solve(self, weights, values, capacity):
+        integral = all(float(w).is_integer() for w in weights) and float(capacity).is_integer()
+        if integral and len(weights)*(capacity+1) <= self.MAX_DP_CELLS:
+            return self.dp.solve(weights, values, capacity)
+        return self.branch_and_bound.solve(weights, values, capacity)
+
+
+# OR-tools is imported by its solver on the first solve
+KNAPSACK_SOLVERS = Registry("knapsack solver", {
+    "native": NativeKnapsackSolver,
+    "dp": DPKnapsackSolver,
+    "branch_and_bound": BranchAndBoundKnapsackSolver,
+    "ortools": ORToolsKnapsackSolver,
+})
+
+
+class OptimizationSolver:
+    """By default it's knapsack solver, the backend is one of KNAPSACK_SOLVERS"""
+
+    def __init__(self, backend="native"):
+        self.backend = KNAPSACK_SOLVERS[backend]()
+
+    def solve(self, weights, values, capacity):
+        """Takes the parameters and outputs the indices of items that are selected"""
+        return self.backend.solve(weights, values, capacity)
@@ -1,11 +1,12 @@
-from utils import find_vehicles
 import numpy as np
 from vehicle import Service
+import copy
 import math
-import pandas as pd
+import multiprocessing
+import time
 from optimization_solver import OptimizationSolver
-from stable_baselines import PPO2, A2C
-from kp_env import KPEnv
+from matching import MATCHING_ALGORITHMS
+from event_log import MIGRATION
 
 
 class OrchestrationModule:
@@ -14,6 +15,8 @@ class OrchestrationModule:
         self.simulation_instance = simulation_instance
         self.fog_nodes = self.simulation_instance.fog_nodes
         self.GAMMA = gamma
+        self.instrumentation = simulation_instance.instrumentation
+        self.event_log = simulation_instance.event_log
 
     def migrate(self, i, j, vehicle_id):
         """Migrates all the service that are required from fog node i to fog node j"""
@@ -21,8 +24,11 @@ class OrchestrationModule:
                     for item in self.fog_nodes[i].get_vehicle_services().values()]
         for service in services:
             if service.vehicle.id == vehicle_id:
-                print(
-                    f'Migrating service {service.id} of vehicle {vehicle_id} from fog node {i} to fog node {j}')
+                if self.event_log is not None:
+                    self.event_log.log(self.simulation_instance.env.now, MIGRATION,
+                                       service.id, vehicle_id, source=i, target=j)
+                if self.instrumentation is not None:
+                    self.instrumentation.count('migrations')
                 self.fog_nodes[i].remove_service(service)
                 self.fog_nodes[j].add_service(service, migrated=True)
                 self.simulation_instance.set_service_node_mapping(
@@ -31,66 +37,41 @@ class OrchestrationModule:
     def step(self):
         raise NotImplementedError
 
+    def close(self):
+        """Releases the resources held by the module when the simulation stops"""
+        pass
 
-class DynamicResourceOrchestrationModule(OrchestrationModule):
 
-    def __init__(self, simulation_instance, gamma=1000):
-        self.array = []
-        super().__init__(simulation_instance, gamma)
-
-    def get_feasible_connected_vehicles(self, i, j):
-        """Returns the ids of connected vehicles that are possible for service migration"""
-        # Feasible connected vehicles for service migrations from i to j
-        # key -> (i,j), value: [list of vehicles]
-        di = set(self.fog_nodes[i].get_vehicle_services().keys())
-        dj = set(self.fog_nodes[j].get_vehicle_services().keys())
-        self.D[i] = di
-        self.D[j] = dj
-        di_cov = {v.id for v in find_vehicles(
-            self.vehicles, self.fog_nodes[i])}
-        dj_cov = {v.id for v in find_vehicles(
-            self.vehicles, self.fog_nodes[j])}
-        dij_cov = di_cov.intersection(dj_cov)
-        res = (di.union(dj)).intersection(dij_cov)
-        return res
-
-    def is_associated(self, i, j):
-        """Returns if jth vehicle is associated with ith fog node"""
-        return j in self.fog_nodes[i].get_vehicle_services().keys()
-
-    def compute_resource_blocks(self):
-        # b[(i,j)] denotes number of resource blocks assigned by fog node i to vehicle j
-        self.b = {}
-        self.vehicle_services = {}
-        for fn in self.fog_nodes:
-            self.vehicle_services.update(fn.get_vehicle_services())
-        serving_vehicles = []
-        for vehicle in self.vehicles:
-            if vehicle.id in self.vehicle_services.keys():
-                serving_vehicles.append(vehicle)
+class DROHeuristic:
+    """
+    Lagrangian heuristic of a pair of fog nodes, reads only b, D, levels,
+    solver, GAMMA and the subgradient settings and writes D_star, d_star, W,
+    the multipliers and the pair statistics
+    """
 
-        for fn in self.fog_nodes:
-            for vehicle in find_vehicles(serving_vehicles, fn):
-                self.b[(fn.id, vehicle.id)
-                       ] = fn.get_resource_blocks(self.vehicle_services[vehicle.id]['service'])
+    def solve_node_knapsack(self, u, fn_id, feasible_connected_vehicles):
+        """Returns the vehicles worth u-b at fog node fn_id that fit in its capacity, and their total worth"""
+        vehicle_list = list(feasible_connected_vehicles)
+        weights = [self.b[(fn_id, k)] for k in vehicle_list]
+        capacity = self.get_capacity(fn_id, feasible_connected_vehicles)
+        values = [u[idx]-self.b[(fn_id, k)]
+                  for idx, k in enumerate(vehicle_list)]
+        selected = self.solver.solve(weights, values, capacity)
+        return {vehicle_list[idx] for idx in selected}, sum(values[idx] for idx in selected)
 
-    def solve_knapsack(self, u, i, j, feasible_connected_vehicles):
+    def solve_knapsack(self, u, i, j, feasible_connected_vehicles, kp1=None):
+        """Takes the solution of KP1 when it was already solved at u"""
         n = len(u)
-        solver = OptimizationSolver()
+        solver = self.solver
         vehicle_list = list(feasible_connected_vehicles)
         # Solving KP1
-        weights = [self.b[(i, k)] for k in vehicle_list]
-        di_fea = self.D[i].intersection(feasible_connected_vehicles)
-        capacity = self.fog_nodes[i].resource_container.level + \
-            sum([self.b[(i, k)] for k in di_fea])
-        values = [u[idx]-self.b[(i, k)]
-                  for idx, k in enumerate(vehicle_list)]
-        n_kp1 = {vehicle_list[idx]
-                 for idx in solver.solve(weights, values, capacity)}
+        if kp1 is None:
+            kp1 = self.solve_node_knapsack(u, i, feasible_connected_vehicles)
+        n_kp1 = kp1[0]
         # Solving KP2
         weights = [self.b[(j, k)] for k in vehicle_list]
         dj_fea = self.D[j].intersection(feasible_connected_vehicles)
-        capacity = self.fog_nodes[j].resource_container.level + \
+        capacity = self.levels[j] + \
             sum([self.b[(j, k)] for k in dj_fea])
         values = []
         for idx, vid in enumerate(vehicle_list):
@@ -138,27 +119,190 @@ class DynamicResourceOrchestrationModule(OrchestrationModule):
             sum([self.b[(j, k)] for k in dj_star_fea])
         return (oij - oij_star)
 
+    def get_allocation_cost(self, i, j, feasible_connected_vehicles):
+        """Returns the resource blocks the current allocation of the feasible connected vehicles uses"""
+        di_fea = self.D[i].intersection(feasible_connected_vehicles)
+        dj_fea = self.D[j].intersection(feasible_connected_vehicles)
+        return sum([self.b[(i, k)] for k in di_fea]) + \
+            sum([self.b[(j, k)] for k in dj_fea])
+
+    def get_capacity(self, fn_id, feasible_connected_vehicles):
+        """Returns the resource blocks fog node fn_id has for the feasible connected vehicles"""
+        return self.levels[fn_id] + sum([self.b[(fn_id, k)] for k in
+                                         self.D[fn_id].intersection(feasible_connected_vehicles)])
+
+    def get_dual_bound(self, u, i, j, feasible_connected_vehicles, kp1=None):
+        """
+        Returns the Lagrangian dual value at u, a lower bound on the resource
+        blocks of every allocation of the feasible connected vehicles to i and
+        j, and the allocation of the two knapsacks that attains it. The
+        knapsack of i is KP1 of solve_knapsack and can be passed in
+        """
+        if kp1 is None:
+            kp1 = self.solve_node_knapsack(u, i, feasible_connected_vehicles)
+        kp2 = self.solve_node_knapsack(u, j, feasible_connected_vehicles)
+        x = {(i, k) for k in kp1[0]}.union({(j, k) for k in kp2[0]})
+        return sum(u)-kp1[1]-kp2[1], x
+
+    def get_dual_gradient(self, x, i, j, feasible_connected_vehicles):
+        """Returns the subgradient 1-x_ik-x_jk of the dual value, positive for vehicles no knapsack took"""
+        return [1-self.get_x(x, i, k)-self.get_x(x, j, k) for k in feasible_connected_vehicles]
+
+    def get_feasible_allocation(self, x, i, j, feasible_connected_vehicles):
+        """
+        Repairs the allocation of the dual knapsacks into one where every
+        vehicle is served by exactly one of the fog nodes, or returns None
+        """
+        load = {i: 0, j: 0}
+        capacity = {fn_id: self.get_capacity(fn_id, feasible_connected_vehicles)
+                    for fn_id in (i, j)}
+        allocation = set()
+        left = []
+        for k in feasible_connected_vehicles:
+            fn_ids = [fn_id for fn_id in (i, j) if (fn_id, k) in x]
+            if not fn_ids:
+                left.append(k)
+                continue
+            # Dropping a vehicle taken by both knapsacks keeps both within capacity
+            fn_id = min(fn_ids, key=lambda fn_id: self.b[(fn_id, k)])
+            allocation.add((fn_id, k))
+            load[fn_id] += self.b[(fn_id, k)]
+        for k in left:
+            for fn_id in sorted((i, j), key=lambda fn_id: self.b[(fn_id, k)]):
+                if load[fn_id] + self.b[(fn_id, k)] <= capacity[fn_id]:
+                    allocation.add((fn_id, k))
+                    load[fn_id] += self.b[(fn_id, k)]
+                    break
+            else:
+                return None
+        return allocation
+
+    def get_initial_multipliers(self, i, j, feasible_connected_vehicles):
+        """Starts from the multipliers of the last step of the pair, one step back, when warm starting"""
+        if not self.warm_start:
+            return [0]*len(feasible_connected_vehicles)
+        previous = self.multipliers.get((i, j), {})
+        return [max(0, previous.get(k, 0)-self.GAMMA) for k in feasible_connected_vehicles]
+
+    def get_step_size(self, step, iteration, du, stalled, gap):
+        """Returns the step size of the next multiplier update for the configured step rule"""
+        if self.step_rule == "diminishing":
+            return self.GAMMA/math.sqrt(iteration)
+        if self.step_rule == "adaptive":
+            # Double the step while the knapsack solutions do not change
+            return 2*step if stalled else self.GAMMA
+        if self.step_rule == "polyak" and gap is not None and gap > 0 and np.dot(du, du) > 0:
+            # Long steps while the dual bound is far from the best allocation
+            return gap/np.dot(du, du)
+        return self.GAMMA
+
+    def record_pair_stats(self, i, j, iterations, solves, gap, seconds):
+        stats = self.pair_stats.setdefault(
+            (i, j), {"calls": 0, "iterations": 0, "solves": 0, "seconds": 0})
+        stats["calls"] += 1
+        stats["iterations"] += iterations
+        stats["solves"] += solves
+        stats["seconds"] += seconds
+        stats["last_iterations"] = iterations
+        stats["last_solves"] = solves
+        stats["last_gap"] = gap
+        stats["last_seconds"] = seconds
+        if self.instrumentation is not None:
+            self.instrumentation.count('knapsack_solves', solves)
+            self.instrumentation.record_pair(i, j, seconds)
+
     def compute_heuristic(self, i, j, feasible_connected_vehicles):
-        u = [0]*len(feasible_connected_vehicles)
+        start = time.perf_counter()
+        u = self.get_initial_multipliers(i, j, feasible_connected_vehicles)
         new_x = None
         patience = 1000000/self.GAMMA
         eps = 2*math.sqrt(len(feasible_connected_vehicles))
         gamma = self.GAMMA
+        step = gamma
         old_du = 0
+        iterations = 0
+        solves = 0
+        # The bounds are only computed when a rule needs them, as they cost
+        # another knapsack, and only once the allocation stalls, as most pairs
+        # converge in a few iterations. From then on the multipliers follow the
+        # subgradient of the dual value so that the lower bound rises to the upper bound
+        bounded = self.gap_tolerance is not None or self.step_rule == "polyak"
+        bounding = False
+        gap = None
+        if bounded:
+            upper_bound = self.get_allocation_cost(
+                i, j, feasible_connected_vehicles)
+            lower_bound = -math.inf
+            best_x = None
         while patience >= 0:
+            if self.max_iterations is not None and iterations >= self.max_iterations:
+                break
+            kp1 = self.solve_node_knapsack(
+                u, i, feasible_connected_vehicles) if bounding else None
             new_x = self.solve_knapsack(
-                u, i, j, feasible_connected_vehicles)
+                u, i, j, feasible_connected_vehicles, kp1)
+            last_u = list(u)
+            iterations += 1
+            solves += 2
             du = self.get_gradient(
                 new_x, i, j, feasible_connected_vehicles)
+            converged = np.linalg.norm(du) >= eps
+            if bounding:
+                dual_bound, dual_x = self.get_dual_bound(
+                    u, i, j, feasible_connected_vehicles, kp1)
+                solves += 1
+                lower_bound = max(lower_bound, dual_bound)
+                # The dual bound rises without limit when the pair cannot hold
+                # every vehicle, so only a better allocation counts as progress
+                improved = False
+                candidates = [self.get_feasible_allocation(
+                    dual_x, i, j, feasible_connected_vehicles)]
+                if converged:
+                    # Every vehicle is allocated, so new_x is a feasible allocation
+                    candidates.append(new_x)
+                for candidate in candidates:
+                    if candidate is None:
+                        continue
+                    cost = sum([self.b[key] for key in candidate])
+                    if cost < upper_bound:
+                        upper_bound, best_x = cost, candidate
+                        improved = True
+                gap = upper_bound-lower_bound
+                du = self.get_dual_gradient(
+                    dual_x, i, j, feasible_connected_vehicles)
+            step = self.get_step_size(
+                step, iterations, du, old_du == du,
+                upper_bound-dual_bound if bounding else None)
             for k in range(len(u)):
-                u[k] = u[k] + gamma * du[k]
-            if old_du == du:
+                u[k] = u[k] + step * du[k]
+            # The dual subgradient can change every iteration without a better allocation
+            stalled = not improved if bounding else old_du == du
+            if stalled:
                 patience -= 1
             else:
                 patience = 1000000/gamma
-            if np.linalg.norm(du) >= eps:
+            if converged:
+                break
+            if bounding and gap <= (self.gap_tolerance or 0)*abs(upper_bound):
+                # Nothing better than the best known allocation is left to find
+                if best_x is None:
+                    best_x = {(i, k) for k in self.D[i].intersection(feasible_connected_vehicles)}.union(
+                        {(j, k) for k in self.D[j].intersection(feasible_connected_vehicles)})
+                new_x = best_x
                 break
+            if bounded and not bounding and stalled:
+                bounding = True
+                patience = 1000000/gamma
             old_du = du
+        if self.warm_start and iterations:
+            self.multipliers[(i, j)] = dict(
+                zip(feasible_connected_vehicles, last_u))
+        self.record_pair_stats(i, j, iterations, solves,
+                               gap, time.perf_counter()-start)
+        self.store_pair_solution(i, j, new_x, feasible_connected_vehicles)
+
+    def store_pair_solution(self, i, j, new_x, feasible_connected_vehicles):
+        """Derives D_star, d_star and W of the pair from the allocation new_x unless it is empty"""
         if new_x is not None and len(new_x) != 0:
             # for k in feasible_connected_vehicles:
             #     if not (i, k) in new_x and not (j, k) in new_x:
@@ -177,39 +321,256 @@ class DynamicResourceOrchestrationModule(OrchestrationModule):
             self.W[(i, j)] = self.get_weight(
                 i, j, feasible_connected_vehicles)
 
+
+class DROSnapshot(DROHeuristic):
+    """Immutable copy of the inputs of the heuristic that is shipped to the worker processes"""
+
+    def __init__(self, module):
+        self.b = module.b
+        self.D = module.D
+        self.levels = module.levels
+        self.solver = module.solver
+        self.GAMMA = module.GAMMA
+        self.step_rule = module.step_rule
+        self.gap_tolerance = module.gap_tolerance
+        self.max_iterations = module.max_iterations
+        self.warm_start = module.warm_start
+        self.multipliers = module.multipliers
+        # The counters are merged in the main process, see record_pair_stats
+        self.instrumentation = None
+        self.pair_stats = {}
+        self.D_star = {}
+        self.d_star = {}
+        self.W = {}
+
+
+def _evaluate_pairs(args):
+    """Runs the heuristic for a chunk of pairs in a worker process"""
+    snapshot, pairs = args
+    results = []
+    for i, j, feasible_connected_vehicles in pairs:
+        snapshot.compute_heuristic(i, j, feasible_connected_vehicles)
+        stats = snapshot.pair_stats[(i, j)]
+        migration = None
+        if (i, j) in snapshot.W:
+            migration = (snapshot.W[(i, j)], snapshot.D_star[i], snapshot.D_star[j],
+                         snapshot.d_star[(i, j)], snapshot.d_star[(j, i)])
+        results.append((i, j, (stats["last_iterations"], stats["last_solves"],
+                               stats["last_gap"], stats["last_seconds"]),
+                        snapshot.multipliers.get((i, j)), migration))
+    return results
+
+
+class DynamicResourceOrchestrationModule(OrchestrationModule, DROHeuristic):
+
+    def __init__(self, simulation_instance, gamma=1000):
+        self.array = []
+        super().__init__(simulation_instance, gamma)
+        self.solver = OptimizationSolver(
+            simulation_instance.config.get("knapsack_solver", "native"))
+        # Pairs of fog nodes are evaluated in a process pool when more than one worker is configured
+        self.workers = simulation_instance.config.get("orchestration_workers", 1)
+        self.matching = MATCHING_ALGORITHMS[simulation_instance.config.get(
+            "pair_matching", "greedy")]()
+        self.pool = None
+        # Subgradient settings of the heuristic, see get_step_size
+        self.step_rule = simulation_instance.config.get("dro_step_rule", "constant")
+        self.gap_tolerance = simulation_instance.config.get("dro_gap_tolerance", None)
+        self.max_iterations = simulation_instance.config.get("dro_max_iterations", None)
+        self.warm_start = simulation_instance.config.get("dro_warm_start", False)
+        # (i,j) -> {vehicle id: multiplier} of the last step of the pair
+        self.multipliers = {}
+        # (i,j) -> iteration and knapsack solve counts of the pair
+        self.pair_stats = {}
+        # Only re-evaluates the pairs whose fog nodes changed since the last step
+        self.incremental = simulation_instance.config.get(
+            "incremental_orchestration", False)
+        self.b = {}
+        self.D = {}
+        self.epochs = {}
+        self.previous_epochs = {}
+        # (i,j) -> (pair key, (W, d_star[(i,j)], d_star[(j,i)]) or None)
+        self.pair_cache = {}
+        self.pair_cache_hits = 0
+        self.pair_cache_misses = 0
+
+    def get_coverage(self, i):
+        """Returns the ids of the vehicles covered by fog node i, computed at most once per step"""
+        if i not in self.coverage:
+            vehicle_index = self.simulation_instance.vehicle_index
+            self.coverage[i] = {
+                v.id for v in vehicle_index.find_vehicles(self.fog_nodes[i])}
+        return self.coverage[i]
+
+    def get_feasible_connected_vehicles(self, i, j):
+        """Returns the ids of connected vehicles that are possible for service migration"""
+        # Feasible connected vehicles for service migrations from i to j
+        # key -> (i,j), value: [list of vehicles]
+        dij_cov = self.get_coverage(i).intersection(self.get_coverage(j))
+        res = (self.D[i].union(self.D[j])).intersection(dij_cov)
+        return res
+
+    def get_pair_key(self, i, j):
+        """The state of the pair its heuristic depends on, the epochs change whenever services or their vehicles change"""
+        return (self.epochs[i], self.epochs[j], self.levels[i], self.levels[j])
+
+    def get_candidate_pairs(self):
+        """
+        Yields the pairs of fog nodes with overlapping coverage that share
+        feasible connected vehicles, other pairs can never migrate a service.
+        In incremental mode the pairs whose state did not change since they
+        were last evaluated are skipped, their cached result is reused
+        """
+        neighbors = self.simulation_instance.fog_node_index.neighbors
+        for i in range(len(self.fog_nodes)):
+            for j in neighbors[i]:
+                key = self.get_pair_key(i, j)
+                cached = self.pair_cache.get((i, j))
+                if self.incremental and cached is not None and cached[0] == key:
+                    self.pair_cache_hits += 1
+                    continue
+                self.pair_cache_misses += 1
+                self.pair_cache[(i, j)] = (key, None)
+                feasible_connected_vehicles = self.get_feasible_connected_vehicles(
+                    i, j)
+                if feasible_connected_vehicles:
+                    yield i, j, feasible_connected_vehicles
+
+    def merge_pair_results(self):
+        """Rebuilds W and d_star in pair order from the evaluated and the cached pairs"""
+        for (i, j), (key, result) in self.pair_cache.items():
+            if (i, j) in self.W:
+                self.pair_cache[(i, j)] = (key, (self.W[(i, j)], self.d_star[(i, j)], self.d_star[(j, i)]))
+        self.W = {}
+        self.d_star = {}
+        neighbors = self.simulation_instance.fog_node_index.neighbors
+        for i in range(len(self.fog_nodes)):
+            for j in neighbors[i]:
+                result = self.pair_cache[(i, j)][1]
+                if result is None:
+                    continue
+                weight, dij_star, dji_star = result
+                self.d_star[(i, j)] = dij_star
+                self.d_star[(j, i)] = dji_star
+                self.W[(i, j)] = weight
+
+    def is_associated(self, i, j):
+        """Returns if jth vehicle is associated with ith fog node"""
+        return j in self.fog_nodes[i].get_vehicle_services().keys()
+
+    def compute_resource_blocks(self):
+        # b[(i,j)] denotes number of resource blocks assigned by fog node i to vehicle j
+        previous_D = self.D
+        self.D = {}
+        self.vehicle_services = {}
+        for fn in self.fog_nodes:
+            self.vehicle_services.update(fn.get_vehicle_services())
+            self.D[fn.id] = set(fn.get_vehicle_services().keys())
+        serving_vehicles = []
+        for vehicle in self.vehicles:
+            if vehicle.id in self.vehicle_services.keys():
+                serving_vehicles.append(vehicle)
+
+        if not self.incremental:
+            self.b = {}
+            self.store_resource_blocks(self.fog_nodes, serving_vehicles)
+            return
+        # An entry of b only changes when the fog node or the fog node of the
+        # vehicle gained or lost services or saw their vehicles move
+        dirty_nodes = [fn for fn in self.fog_nodes
+                       if self.epochs[fn.id] != self.previous_epochs.get(fn.id)]
+        dirty_ids = {fn.id for fn in dirty_nodes}
+        dirty_vehicles = set()
+        for fn in dirty_nodes:
+            dirty_vehicles.update(previous_D.get(fn.id, ()), self.D[fn.id])
+        for key in [key for key in self.b if key[0] in dirty_ids or key[1] in dirty_vehicles]:
+            del self.b[key]
+        self.store_resource_blocks(dirty_nodes, serving_vehicles)
+        self.store_resource_blocks(
+            [fn for fn in self.fog_nodes if fn.id not in dirty_ids],
+            [vehicle for vehicle in serving_vehicles if vehicle.id in dirty_vehicles])
+
+    def store_resource_blocks(self, fog_nodes, vehicles):
+        """Fills b for the given fog nodes and the serving vehicles in their coverage"""
+        if not fog_nodes or not vehicles:
+            return
+        sinr_engine = self.simulation_instance.sinr_engine
+        in_coverage = sinr_engine.get_coverage_matrix(fog_nodes, vehicles)
+        sinr = sinr_engine.get_sinr_matrix(fog_nodes, vehicles)
+        for row, col in zip(*np.nonzero(in_coverage)):
+            fn = fog_nodes[row]
+            vehicle = vehicles[col]
+            _, self.b[(fn.id, vehicle.id)] = fn.store_sinr(
+                self.vehicle_services[vehicle.id]['service'], float(sinr[row, col]))
+
+    def evaluate_pairs(self):
+        """Runs the heuristic of the candidate pairs one after the other"""
+        for i, j, feasible_connected_vehicles in self.get_candidate_pairs():
+            self.compute_heuristic(i, j, feasible_connected_vehicles)
+
+    def evaluate_pairs_in_pool(self):
+        """
+        Runs the heuristic of all the pairs on a snapshot of the fog nodes in
+        the worker processes and merges the results back in pair order, so that
+        the outcome is the same as evaluating the pairs one after the other
+        """
+        pairs = [(i, j, list(feasible_connected_vehicles))
+                 for i, j, feasible_connected_vehicles in self.get_candidate_pairs()]
+        if not pairs:
+            return
+        if self.pool is None:
+            self.pool = multiprocessing.get_context("fork").Pool(self.workers)
+        snapshot = DROSnapshot(self)
+        chunk_size = math.ceil(len(pairs)/self.workers)
+        chunks = [(snapshot, pairs[k:k+chunk_size])
+                  for k in range(0, len(pairs), chunk_size)]
+        for results in self.pool.map(_evaluate_pairs, chunks):
+            for i, j, stats, multipliers, migration in results:
+                self.record_pair_stats(i, j, *stats)
+                if multipliers is not None:
+                    self.multipliers[(i, j)] = multipliers
+                if migration is None:
+                    continue
+                weight, di_star, dj_star, dij_star, dji_star = migration
+                self.D_star[i] = di_star
+                self.D_star[j] = dj_star
+                self.d_star[(i, j)] = dij_star
+                self.d_star[(j, i)] = dji_star
+                self.W[(i, j)] = weight
+
+    def get_pair_stats(self):
+        """Returns the iteration and knapsack solve counts of the heuristic per pair of fog nodes"""
+        return self.pair_stats
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
     def get_optimal_pairs(self):
         """Performs maximum weight matching on fog node graph to get the optimal pairs of fog nodes for service migration"""
-        phi = set()
-        while self.W:
-            edge = max(self.W, key=self.W.get)
-            phi.add(edge)
-            new_W = {}
-            for key in self.W.keys():
-                if not(edge[0] in key or edge[1] in key):
-                    new_W[key] = self.W[key]
-            self.W = new_W
-        return phi
+        return self.matching.match(self.W)
 
     def step(self):
         self.vehicles = self.simulation_instance.mobility_model.vehicles.values()
-        self.D = {}
         self.D_star = {}
         self.d_star = {}
         self.W = {}
+        self.previous_epochs = self.epochs
+        self.epochs = {fn.id: fn.epoch for fn in self.fog_nodes}
         self.compute_resource_blocks()
         # X_ij denotes whether ith fog node is connected jth vehicle
-        self.x = set()
-        for fn in self.fog_nodes:
-            for v in self.vehicles:
-                if self.is_associated(fn.id, v.id):
-                    self.x.add((fn.id, v.id))
+        self.x = {(i, k) for i, vehicle_ids in self.D.items()
+                  for k in vehicle_ids}
 
-        for i in range(len(self.fog_nodes)):
-            for j in range(i+1, len(self.fog_nodes)):
-                feasible_connected_vehicles = self.get_feasible_connected_vehicles(
-                    i, j)
-                if feasible_connected_vehicles:
-                    self.compute_heuristic(i, j, feasible_connected_vehicles)
+        self.coverage = {}
+        self.levels = [fn.resource_container.level for fn in self.fog_nodes]
+        if self.workers > 1:
+            self.evaluate_pairs_in_pool()
+        else:
+            self.evaluate_pairs()
+        self.merge_pair_results()
 
         phi = self.get_optimal_pairs()
 
@@ -220,15 +581,87 @@ class DynamicResourceOrchestrationModule(OrchestrationModule):
                 self.migrate(j, i, vehicle_id)
 
 
+class PairEpisode:
+    """Picks the vehicles of a pair of fog nodes one action at a time on its own copy of the KPEnv"""
+
+    def __init__(self, i, j, feasible_connected_vehicles, veh, env, vector):
+        self.i = i
+        self.j = j
+        self.feasible_connected_vehicles = feasible_connected_vehicles
+        self.veh = veh
+        self.env = copy.copy(env)
+        self.env.vector = vector
+        self.env.ow = [0, 0]
+        self.obs = np.array(vector)
+        self.new_x = set()
+        # Actions that picked no remaining vehicle
+        self.stalls = 0
+
+    def step(self, action):
+        """Applies the predicted action and returns whether the episode is done"""
+        self.obs, rew, done, _ = self.env.step(action)
+        if action[0] >= len(self.veh):
+            self.stalls += 1
+            return False
+        v = self.veh.pop(action[0])
+        if rew >= 0:
+            # Allot the predicted action
+            if action[1] == 0:
+                self.new_x.add((self.i, v))
+            else:
+                self.new_x.add((self.j, v))
+        return done
+
+
 class RLOrchestrationModule(DynamicResourceOrchestrationModule):
 
     def __init__(self, simulation_instance, gamma=1000):
         super().__init__(simulation_instance)
+        # The policy network is evaluated in this process
+        self.workers = 1
+        # Runs the policy on the observations of all the pairs at once
+        self.batch_inference = simulation_instance.config.get(
+            "rl_batch_inference", True)
+        # TensorFlow and the RL stack are only imported by simulations that use them
+        import tensorflow as tf
+        from stable_baselines import A2C
+        from kp_env import KPEnv
+        tf.logging.set_verbosity(tf.logging.ERROR)
         self.env = KPEnv()
         self.model = A2C.load("omsr_power_final_2")
 
-    def compute_heuristic(self, i, j, feasible_connected_vehicles):
-        # print("Here")
+    def evaluate_pairs(self):
+        """
+        Advances the episodes of all the candidate pairs in lockstep, every
+        round predicts the actions of all the unfinished pairs in one batch
+        """
+        if not self.batch_inference:
+            return super().evaluate_pairs()
+        episodes = []
+        for i, j, feasible_connected_vehicles in self.get_candidate_pairs():
+            veh, feasible_connected_vehicles, vector = self.get_observation(
+                i, j, feasible_connected_vehicles)
+            episodes.append(PairEpisode(
+                i, j, feasible_connected_vehicles, veh, self.env, vector))
+        active = episodes
+        while active:
+            actions, _states = self.model.predict(
+                np.array([episode.obs for episode in active]))
+            active = [episode for episode, action in zip(active, actions)
+                      if not episode.step(action)]
+        for episode in episodes:
+            self.record_episode_stats(episode.i, episode.j, episode.stalls)
+            self.store_pair_solution(
+                episode.i, episode.j, episode.new_x, episode.feasible_connected_vehicles)
+
+    def record_episode_stats(self, i, j, stalls):
+        """Counts the episodes of the pair and their actions that picked no remaining vehicle"""
+        stats = self.pair_stats.setdefault((i, j), {"calls": 0, "stalls": 0})
+        stats["calls"] += 1
+        stats["stalls"] += stalls
+
+    def get_observation(self, i, j, feasible_connected_vehicles):
+        """Returns the vehicles considered for the pair, as a list and a set, and its KPEnv observation vector"""
         veh = list(feasible_connected_vehicles)
         veh = veh[:self.env.N]
         feasible_connected_vehicles = set(veh)
@@ -274,27 +707,30 @@ class RLOrchestrationModule(DynamicResourceOrchestrationModule):
             vector.append(cache2[index])
         while len(vector) < 6*self.env.N+9:
             vector = vector + [0, 0, 0, 0, 0, 0]
+        return veh, feasible_connected_vehicles, vector
+
+    def compute_heuristic(self, i, j, feasible_connected_vehicles):
+        # print("Here")
+        veh, feasible_connected_vehicles, vector = self.get_observation(
+            i, j, feasible_connected_vehicles)
         self.env.vector = vector
         obs = vector
         new_x = set()
         # TODO RL: Order by occupied load to get better results
         # print(feasible_connected_vehicles)
-        patience = 0
+        # Actions that picked no remaining vehicle
+        stalls = 0
         while True:
             prev_obs = obs
             action, _states = self.model.predict(obs)
             # print(self.model.action_probability(obs))
             # print(action, obs[0])
             obs, rew, done, _ = self.env.step(action)
-            # if patience >= 100:
-            #     break
             if action[0] >= len(veh):
-                patience += 1
-                print(patience)
+                stalls += 1
                 continue
             # if action[0] != 0:
             #     print(action, prev_obs)
-            patience = 0
             v = veh.pop(action[0])
             if rew >= 0:
                 # Allot the predicted action
@@ -306,21 +742,5 @@ class RLOrchestrationModule(DynamicResourceOrchestrationModule):
                 # print("Done breaking")
                 break
         # print(new_x)
-        if new_x is not None and len(new_x) != 0:
-
-            # for k in feasible_connected_vehicles:
-            #     if not (i, k) in new_x and not (j, k) in new_x:
-            #         if (i, k) in self.x:
-            #             new_x.add((i, k))
-            #         else:
-            #             new_x.add((j, k))
-            self.D_star[i] = self.get_D_star(i, new_x)
-            self.D_star[j] = self.get_D_star(j, new_x)
-            self.d_star[(i, j)] = (self.D[i].intersection(
-                feasible_connected_vehicles)).difference(self.D_star[i])
-            self.d_star[(j, i)] = (self.D[j].intersection(
-                feasible_connected_vehicles)).difference(self.D_star[j])
-            # self.d_star[(i, j)] = self.D[i].difference(self.D_star[i])
-            # self.d_star[(j, i)] = self.D[j].difference(self.D_star[j])
-            self.W[(i, j)] = self.get_weight(
-                i, j, feasible_connected_vehicles)
+        self.record_episode_stats(i, j, stalls)
+        self.store_pair_solution(i, j, new_x, feasible_connected_vehicles)
@@ -1,3 +1,4 @@
+import numpy as np
 from utils import find_feasible_fog_nodes
 
 # TODO: Create a factory class
@@ -6,8 +7,9 @@ from utils import find_feasible_fog_nodes
 class AllocationPolicy:
     """Policy for allocation vehicle services to fog nodes"""
 
-    def __init__(self, fog_nodes):
+    def __init__(self, fog_nodes, fog_node_index=None):
         self.fog_nodes = fog_nodes
+        self.fog_node_index = fog_node_index
 
     def find_best_fog_node(self, vehicle):
         """Finds the best fog node according to the policy"""
@@ -16,8 +18,12 @@ class AllocationPolicy:
     def allocate(self, service):
         """Takes a service and implements the allocation algorithm for choosing fog nodes"""
         vehicle = service.vehicle
-        self.feasible_fog_nodes = find_feasible_fog_nodes(
-            self.fog_nodes, vehicle)
+        if self.fog_node_index is not None:
+            self.feasible_fog_nodes = self.fog_node_index.find_feasible_fog_nodes(
+                vehicle)
+        else:
+            self.feasible_fog_nodes = find_feasible_fog_nodes(
+                self.fog_nodes, vehicle)
         best_fog_node = self.find_best_fog_node(vehicle, service)
         if best_fog_node:
             best_fog_node.add_service(service)
@@ -29,12 +35,11 @@ class SignalAwareAllocationPolicy(AllocationPolicy):
     """Choose fog node having the maximum sinr for a vehicle"""
 
     def find_best_fog_node(self, vehicle, service):
-        sinr_values = [fog_node._get_sinr(vehicle)
-                       for fog_node in self.feasible_fog_nodes]
-        if len(sinr_values) == 0:
+        if len(self.feasible_fog_nodes) == 0:
             return None
-        best_fog_node = self.feasible_fog_nodes[sinr_values.index(
-            max(sinr_values))]
+        sinr_values = self.feasible_fog_nodes[0].sinr_engine.get_sinr_matrix(
+            self.feasible_fog_nodes, [vehicle])[:, 0]
+        best_fog_node = self.feasible_fog_nodes[int(np.argmax(sinr_values))]
         return best_fog_node
 
 
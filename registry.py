@@ -0,0 +1,51 @@
+import importlib
+
+
+class Registry:
+    """
+    Maps names used in configs to classes. Entries are "module:attribute"
+    strings, so the module of a backend and everything it depends on is only
+    imported once a config selects it
+    """
+
+    def __init__(self, kind, entries=None):
+        self.kind = kind
+        self._entries = dict(entries or {})
+        self._loaded = {}
+
+    def register(self, name, entry):
+        """Takes a class or a "module:attribute" string"""
+        self._entries[name] = entry
+        self._loaded.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __getitem__(self, name):
+        if name not in self._loaded:
+            if name not in self._entries:
+                raise ValueError(
+                    f'Unknown {self.kind} {name!r}, expected one of {list(self._entries)}')
+            entry = self._entries[name]
+            if isinstance(entry, str):
+                module, attribute = entry.split(":")
+                entry = getattr(importlib.import_module(module), attribute)
+            self._loaded[name] = entry
+        return self._loaded[name]
+
+
+ALLOCATION_POLICIES = Registry("allocation policy", {
+    "signal_aware": "policy:SignalAwareAllocationPolicy",
+    "capacity_aware": "policy:CapacityAwareAllocationPolicy",
+    "content_aware": "policy:ContentAwareAllocationPolicy",
+})
+
+# Simulations without an orchestration scheme get the module that never migrates
+ORCHESTRATION_SCHEMES = Registry("orchestration scheme", {
+    None: "orchestration:OrchestrationModule",
+    "dro": "orchestration:DynamicResourceOrchestrationModule",
+    "rl": "orchestration:RLOrchestrationModule",
+})
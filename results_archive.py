@@ -0,0 +1,192 @@
+import json
+import os
+import tempfile
+import numpy as np
+
+# Bump when the layout of the chunks or the manifest changes
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+COLUMNS = {
+    "config": np.int32,
+    "seed": np.int64,
+    "metric": np.int32,
+    "tick": np.int32,
+    "value": np.float64,
+}
+
+
+def _write_json(path, data):
+    """Replaces the file atomically so that readers never see a partial manifest"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class ResultsArchive:
+    """
+    Append only columnar store of metric series. Every value is a row of
+    (config, seed, metric, tick, value) and rows are written in chunks of
+    .npy columns, with the names of configs and metrics kept in a manifest
+    """
+
+    def __init__(self, path, chunk_rows=1 << 16):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        os.makedirs(path, exist_ok=True)
+        manifest_path = os.path.join(path, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+            if self.manifest["version"] != FORMAT_VERSION:
+                raise ValueError(
+                    f'Archive {path} has version {self.manifest["version"]}, expected {FORMAT_VERSION}')
+        else:
+            self.manifest = {"version": FORMAT_VERSION,
+                             "configs": [], "metrics": [], "chunks": []}
+        self._config_ids = {name: idx for idx,
+                            name in enumerate(self.manifest["configs"])}
+        self._metric_ids = {name: idx for idx,
+                            name in enumerate(self.manifest["metrics"])}
+        self._pending = []
+        self._pending_rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _get_id(ids, names, name):
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(name)
+        return ids[name]
+
+    def append(self, config, seed, metrics):
+        """Takes the output of Simulation.get_metrics of one run of the config with the seed"""
+        config_id = self._get_id(
+            self._config_ids, self.manifest["configs"], config)
+        for name, values in metrics.items():
+            metric_id = self._get_id(
+                self._metric_ids, self.manifest["metrics"], name)
+            values = np.asarray(values, dtype=np.float64)
+            n = len(values)
+            self._pending.append({
+                "config": np.full(n, config_id, dtype=np.int32),
+                "seed": np.full(n, seed, dtype=np.int64),
+                "metric": np.full(n, metric_id, dtype=np.int32),
+                "tick": np.arange(n, dtype=np.int32),
+                "value": values,
+            })
+            self._pending_rows += n
+        if self._pending_rows >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """Writes the pending rows as a new chunk and adds it to the manifest"""
+        if not self._pending:
+            return
+        columns = {name: np.concatenate([rows[name] for rows in self._pending])
+                   for name in COLUMNS}
+        # Rows of the same config and metric are contiguous within a chunk
+        order = np.lexsort((columns["tick"], columns["seed"],
+                            columns["metric"], columns["config"]))
+        # The chunk is renamed into place once complete, like the trace cache
+        tmp_path = tempfile.mkdtemp(dir=self.path)
+        for name, column in columns.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), column[order])
+        chunk = f"chunk-{len(self.manifest['chunks']):06d}"
+        os.rename(tmp_path, os.path.join(self.path, chunk))
+        self.manifest["chunks"].append({
+            "name": chunk,
+            "rows": int(len(order)),
+            "configs": np.unique(columns["config"]).tolist(),
+            "metrics": np.unique(columns["metric"]).tolist(),
+        })
+        _write_json(os.path.join(self.path, MANIFEST), self.manifest)
+        self._pending = []
+        self._pending_rows = 0
+
+    def close(self):
+        self.flush()
+
+
+class ResultsReader:
+    """Memory maps the chunks of a results archive and slices them by config and metric"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.configs = self.manifest["configs"]
+        self.metrics = self.manifest["metrics"]
+        self._chunks = {}
+
+    def _get_chunk(self, name):
+        if name not in self._chunks:
+            self._chunks[name] = {
+                column: np.load(os.path.join(self.path, name, f"{column}.npy"), mmap_mode="r")
+                for column in COLUMNS}
+        return self._chunks[name]
+
+    def select(self, config=None, metric=None):
+        """Returns the columns of the rows of the config and metric, None selects all of them"""
+        config_id = None if config is None else self.configs.index(config)
+        metric_id = None if metric is None else self.metrics.index(metric)
+        parts = []
+        for entry in self.manifest["chunks"]:
+            if config_id is not None and config_id not in entry["configs"]:
+                continue
+            if metric_id is not None and metric_id not in entry["metrics"]:
+                continue
+            chunk = self._get_chunk(entry["name"])
+            # Chunks are sorted by config then metric, so the rows are one slice
+            start, stop = 0, entry["rows"]
+            if config_id is not None:
+                start, stop = np.searchsorted(
+                    chunk["config"], [config_id, config_id+1])
+            if metric_id is not None:
+                if config_id is not None:
+                    offset = start
+                    start, stop = offset + np.searchsorted(
+                        chunk["metric"][start:stop], [metric_id, metric_id+1])
+                else:
+                    mask = np.asarray(chunk["metric"]) == metric_id
+                    parts.append({column: np.asarray(values)[mask]
+                                  for column, values in chunk.items()})
+                    continue
+            parts.append({column: values[start:stop]
+                          for column, values in chunk.items()})
+        if not parts:
+            return {column: np.empty(0, dtype=dtype) for column, dtype in COLUMNS.items()}
+        if len(parts) == 1:
+            return parts[0]
+        return {column: np.concatenate([part[column] for part in parts]) for column in COLUMNS}
+
+    def get_seeds(self, config):
+        return np.unique(self.select(config)["seed"]).tolist()
+
+    def get_series(self, config, metric):
+        """
+        Returns (seeds, values) where values has a row per seed padded with
+        nan after the last tick of the run
+        """
+        rows = self.select(config, metric)
+        seeds, row = np.unique(rows["seed"], return_inverse=True)
+        length = int(rows["tick"].max())+1 if len(rows["tick"]) else 0
+        values = np.full((len(seeds), length), np.nan)
+        values[row, rows["tick"]] = rows["value"]
+        return seeds, values
+
+    def get_metrics(self, config, seed):
+        """Returns the metrics of one run in the shape of Simulation.get_metrics"""
+        rows = self.select(config)
+        metrics = {}
+        for metric_id in np.unique(rows["metric"]).tolist():
+            mask = (rows["seed"] == seed) & (rows["metric"] == metric_id)
+            if mask.any():
+                order = np.argsort(rows["tick"][mask])
+                metrics[self.metrics[metric_id]] = rows["value"][mask][order].tolist()
+        return metrics
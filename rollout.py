@@ -0,0 +1,222 @@
+import multiprocessing
+import random
+import time
+import numpy as np
+from constants import TIME_MULTIPLIER
+
+# tf.nn.leaky_relu
+LEAKY_RELU_ALPHA = 0.2
+
+
+class MLPPolicy:
+    """
+    NumPy copy of the fully connected q network of agent.py, so that rollout
+    workers can act without a TensorFlow session
+    """
+
+    def __init__(self, layer_sizes):
+        self.shapes = []
+        for n_in, n_out in zip(layer_sizes[:-1], layer_sizes[1:]):
+            self.shapes.append((n_in, n_out))
+            self.shapes.append((n_out,))
+        self.size = sum(int(np.prod(shape)) for shape in self.shapes)
+        self.params = [np.zeros(shape, dtype=np.float32) for shape in self.shapes]
+
+    def load(self, flat):
+        """Takes the weights and biases of every layer flattened in order"""
+        offset = 0
+        for param in self.params:
+            param[...] = flat[offset:offset+param.size].reshape(param.shape)
+            offset += param.size
+
+    @staticmethod
+    def flatten(params):
+        return np.concatenate([np.ravel(param) for param in params]).astype(np.float32)
+
+    def q_values(self, obs):
+        out = np.asarray(obs, dtype=np.float32)
+        n_layers = len(self.params)//2
+        for layer in range(n_layers):
+            out = out @ self.params[2*layer] + self.params[2*layer+1]
+            if layer < n_layers-1:
+                out = np.where(out > 0, out, LEAKY_RELU_ALPHA*out)
+        return out
+
+    def act(self, obs, eps, rng):
+        """Epsilon greedy action, like the act function of deepq"""
+        q_values = self.q_values(obs)
+        if rng.random_sample() < eps:
+            return rng.randint(len(q_values))
+        return int(np.argmax(q_values))
+
+
+class TransitionBuffer:
+    """
+    Single producer single consumer ring of transitions in shared memory. The
+    worker blocks while the ring is full, the learner drains it
+    """
+
+    def __init__(self, ctx, obs_dim, capacity):
+        self.obs_dim = obs_dim
+        self.capacity = capacity
+        self._obs = ctx.RawArray('f', capacity*obs_dim)
+        self._next_obs = ctx.RawArray('f', capacity*obs_dim)
+        self._actions = ctx.RawArray('q', capacity)
+        self._rewards = ctx.RawArray('f', capacity)
+        self._dones = ctx.RawArray('f', capacity)
+        # Set when the transition ends an episode of the worker
+        self._episode_ends = ctx.RawArray('b', capacity)
+        self.written = ctx.RawValue('q', 0)
+        self.read = ctx.RawValue('q', 0)
+        self._views = None
+
+    def _get_views(self):
+        if self._views is None:
+            self._views = (
+                np.frombuffer(self._obs, dtype=np.float32).reshape(
+                    self.capacity, self.obs_dim),
+                np.frombuffer(self._next_obs, dtype=np.float32).reshape(
+                    self.capacity, self.obs_dim),
+                np.frombuffer(self._actions, dtype=np.int64),
+                np.frombuffer(self._rewards, dtype=np.float32),
+                np.frombuffer(self._dones, dtype=np.float32),
+                np.frombuffer(self._episode_ends, dtype=np.int8),
+            )
+        return self._views
+
+    def put(self, obs, action, reward, next_obs, done, episode_end, stop):
+        """Writes a transition, waits while the learner is a full ring behind"""
+        while self.written.value - self.read.value >= self.capacity:
+            if stop.is_set():
+                return
+            time.sleep(0.001)
+        slot = self.written.value % self.capacity
+        obs_view, next_obs_view, actions, rewards, dones, episode_ends = self._get_views()
+        obs_view[slot] = obs
+        next_obs_view[slot] = next_obs
+        actions[slot] = action
+        rewards[slot] = reward
+        dones[slot] = done
+        episode_ends[slot] = episode_end
+        # Publish the slot only after it is written
+        self.written.value += 1
+
+    def drain(self):
+        """Returns (obs, actions, rewards, next_obs, dones, episode_ends) of the unread transitions"""
+        read, written = self.read.value, self.written.value
+        slots = np.arange(read, written) % self.capacity
+        obs_view, next_obs_view, actions, rewards, dones, episode_ends = self._get_views()
+        batch = (obs_view[slots], actions[slots], rewards[slots],
+                 next_obs_view[slots], dones[slots], episode_ends[slots].astype(bool))
+        self.read.value = written
+        return batch
+
+
+class WeightBroadcast:
+    """Policy weights in shared memory guarded by a sequence number that is odd while they are written"""
+
+    def __init__(self, ctx, size):
+        self._weights = ctx.RawArray('f', size)
+        self.version = ctx.RawValue('q', 0)
+        self.eps = ctx.RawValue('d', 1.0)
+
+    def publish(self, flat):
+        weights = np.frombuffer(self._weights, dtype=np.float32)
+        self.version.value += 1
+        weights[:] = flat
+        self.version.value += 1
+
+    def fetch(self, last_version):
+        """Returns (version, weights), weights is None unless a newer complete copy was read"""
+        version = self.version.value
+        if version == last_version or version % 2:
+            return last_version, None
+        flat = np.frombuffer(self._weights, dtype=np.float32).copy()
+        if self.version.value != version:
+            return last_version, None
+        return version, flat
+
+
+def _rollout_worker(config, seed, layer_sizes, buffer, broadcast, stop, sync_every):
+    """Steps its own simulation with the latest broadcast policy and streams the transitions"""
+    from env import VehicularFogEnv
+    random.seed(seed)
+    np.random.seed(seed)
+    rng = np.random.RandomState(seed)
+    policy = MLPPolicy(layer_sizes)
+    version = 0
+    while version == 0 and not stop.is_set():
+        version, flat = broadcast.fetch(version)
+        if flat is None:
+            time.sleep(0.01)
+        else:
+            policy.load(flat)
+    env = VehicularFogEnv(config=config)
+    env.reset()
+    steps = 0
+    while not stop.is_set():
+        for service_id in list(env.sim_instance._service_node_mapping.keys()):
+            if stop.is_set():
+                return
+            service = env.sim_instance.services[service_id]
+            obs = env.get_observation(service)
+            action = policy.act(obs, broadcast.eps.value, rng)
+            new_obs, rew, don, info = env.step(action, service.id)
+            done = info['done'] or env.sim_instance.is_stopped
+            buffer.put(obs, action, rew, new_obs, float(don), done, stop)
+            steps += 1
+            if steps % sync_every == 0:
+                version, flat = broadcast.fetch(version)
+                if flat is not None:
+                    policy.load(flat)
+            if done:
+                env.reset()
+                break
+        if env.sim_instance.is_stopped:
+            # The simulation ended while none of its services was left to act on
+            env.reset()
+        now = env.sim_instance.env.now
+        # Process all the events until next time
+        while env.sim_instance.env.now-now <= TIME_MULTIPLIER:
+            env.sim_instance.env.step()
+
+
+class RolloutWorkers:
+    """
+    Worker processes that each own a simulation with a distinct seed and
+    stream transitions to the learner through shared memory. They are forked,
+    so start them before the learner creates its TensorFlow session
+    """
+
+    def __init__(self, num_workers, layer_sizes, config=None, seed=0, capacity=4096, sync_every=100):
+        ctx = multiprocessing.get_context("fork")
+        self.policy_size = MLPPolicy(layer_sizes).size
+        self.buffers = [TransitionBuffer(ctx, layer_sizes[0], capacity)
+                        for _ in range(num_workers)]
+        self.broadcast = WeightBroadcast(ctx, self.policy_size)
+        self.stop = ctx.Event()
+        self.processes = [
+            ctx.Process(target=_rollout_worker, daemon=True,
+                        args=(config, seed+index, layer_sizes, buffer, self.broadcast, self.stop, sync_every))
+            for index, buffer in enumerate(self.buffers)]
+        for process in self.processes:
+            process.start()
+
+    def publish(self, params, eps):
+        """Broadcasts the weights and biases of the q network and the exploration rate"""
+        self.broadcast.eps.value = eps
+        self.broadcast.publish(MLPPolicy.flatten(params))
+
+    def set_exploration(self, eps):
+        self.broadcast.eps.value = eps
+
+    def drain(self):
+        """Returns the transitions of all the workers written since the last drain"""
+        return [buffer.drain() for buffer in self.buffers]
+
+    def close(self):
+        self.stop.set()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
@@ -4,37 +4,49 @@ from simpy.rt import RealtimeEnvironment
 from simpy.events import Event
 from simpy.resources.store import Store
 from fognode import Node
+from sinr_engine import SINREngine
+from spatial_index import FogNodeIndex, VehicleIndex
 from vehicle import Service
-import pandas as pd
 from topology import Topology
 from mobility_model import DynamicMobilityModel, StaticSimulatedMobilityModel
-from policy import SignalAwareAllocationPolicy, CapacityAwareAllocationPolicy, ContentAwareAllocationPolicy
-from orchestration import DynamicResourceOrchestrationModule, OrchestrationModule, RLOrchestrationModule
-from metrics import MetricFactory
+from registry import ALLOCATION_POLICIES, ORCHESTRATION_SCHEMES
+from metrics import MetricsEngine, NodeAggregates
+from instrumentation import Instrumentation
+from event_log import EventLog, REJECTION, DEPARTURE
 import json
+import os
 import random
 from constants import TIME_MULTIPLIER, CACHE_CONTENT_TYPES
-import tensorflow as tf
-tf.logging.set_verbosity(tf.logging.ERROR)
 
 
 class Simulation:
 
-    def __init__(self, config='./config.json'):
+    def __init__(self, config='./config.json', run_id=None):
+        """
+        Output files named in the config get the suffix _<run_id> when a
+        run_id is given, so that runs of the same config do not overwrite them
+        """
         self.is_stopped = False
+        self.run_id = run_id
         self.env = Environment()
         self.stop_simulation_event = Event(self.env)
         # Initialise config
         with open(config) as f:
             self.config = json.load(f)
+        self.instrumentation = Instrumentation(
+            self.env) if self.config.get("instrumentation", False) else None
+        self.event_log = EventLog(self.get_output_path("event_log")) if self.config.get(
+            "event_log", None) else None
         self.mobility_model = StaticSimulatedMobilityModel(self.config)
         self.mean_arrival_rate = self.config["mean_arrival_rate"]
         self.mean_departure_rate = self.config["mean_departure_rate"]
         self.env.process(self._monitor_services(self.env))
         self._service_node_mapping = {}
         self.services = {}
+        self.aggregates = NodeAggregates()
         # Initialise fog nodes
         self._init_fog_nodes()
+        self._init_spatial_indices()
         # Initialise update vehicles process
         self.env.process(self._update_vehicles(self.env))
         # Initialise policy
@@ -42,17 +54,12 @@ class Simulation:
         if self.config.get('orchestration_scheme', None):
             self.env.process(self._orchestrate_services(self.env))
         if self.config.get('metrics', None):
-            self.metrics = [MetricFactory(metric)
-                            for metric in self.config['metrics']]
+            self.metrics = MetricsEngine(
+                self.config['metrics'], self.aggregates, self.env)
             self.env.process(self._compute_metrics(self.env))
 
-        if self.config.get("orchestration_scheme", None) == 'dro':
-            self.orchestration_module = DynamicResourceOrchestrationModule(
-                self)
-        elif self.config.get("orchestration_scheme", None) == 'rl':
-            self.orchestration_module = RLOrchestrationModule(self)
-        else:
-            self.orchestration_module = OrchestrationModule(self)
+        self.orchestration_module = ORCHESTRATION_SCHEMES[self.config.get(
+            "orchestration_scheme", None)](self)
 
     def _init_fog_nodes(self):
         self.fog_nodes = [
@@ -61,12 +68,24 @@ class Simulation:
                 self.env,
                 random.randint(*self.config["fn_coverage_radius"]),
                 random.choice(self.config["fn_bandwidth"]),
-                [random.choice([0, 1]) for _ in range(CACHE_CONTENT_TYPES)]
+                [random.choice([0, 1]) for _ in range(CACHE_CONTENT_TYPES)],
+                ledger=self.config.get("resource_ledger", False),
+                aggregates=self.aggregates,
+                event_log=self.event_log
             ) for idx in range(self.config["num_fn"])
         ]
         area = self.config["network_area"]
         Topology(self.config["topology_origin"], area[0],
                  area[1]).assign_positions(self.fog_nodes)
+        self.sinr_engine = SINREngine(self.fog_nodes)
+
+    def _init_spatial_indices(self):
+        self.fog_node_index = FogNodeIndex(self.fog_nodes)
+        self.vehicle_index = VehicleIndex(self.config.get(
+            "spatial_cell_size", self.config["fn_coverage_radius"][0]))
+        self.mobility_model.add_listener(self.vehicle_index)
+        self.mobility_model.add_listener(self.sinr_engine)
+        self.mobility_model.start(self.env)
 
     def _update_vehicles(self, env):
         frame_id = 0
@@ -76,25 +95,34 @@ class Simulation:
             frame_id += 1
 
     def _init_policy(self):
-        allocation_policy = self.config["allocation_policy"]
-        if allocation_policy == 'signal_aware':
-            self.allocation_policy = SignalAwareAllocationPolicy(
-                self.fog_nodes)
-        elif allocation_policy == 'capacity_aware':
-            self.allocation_policy = CapacityAwareAllocationPolicy(
-                self.fog_nodes)
-        elif allocation_policy == 'content_aware':
-            self.allocation_policy = ContentAwareAllocationPolicy(
-                self.fog_nodes)
+        self.allocation_policy = ALLOCATION_POLICIES[self.config["allocation_policy"]](
+            self.fog_nodes, self.fog_node_index)
 
     def _compute_metrics(self, env):
         while True:
-            for metric in self.metrics:
-                metric.compute(self.fog_nodes)
+            self.metrics.compute()
             yield env.timeout(TIME_MULTIPLIER)
 
     def get_metrics(self):
-        return {metric.name: metric.get_values() for metric in self.metrics}
+        return self.metrics.get_metrics()
+
+    def get_output_path(self, key):
+        """Returns the path of the output file that the config names under key for this run"""
+        path = self.config[key]
+        if self.run_id is None:
+            return path
+        root, ext = os.path.splitext(path)
+        return f'{root}_{self.run_id}{ext}'
+
+    def get_cache_stats(self):
+        """
+        Returns the hits and misses of the resource block caches of all fog nodes.
+        There are no hits without the observations of the RL envs
+        """
+        return {
+            "hits": sum(fn.cache_hits for fn in self.fog_nodes),
+            "misses": sum(fn.cache_misses for fn in self.fog_nodes),
+        }
 
     def _monitor_services(self, env):
         self.total_services = 0
@@ -103,15 +131,17 @@ class Simulation:
             service_arrivals = self.mean_arrival_rate
             service_departures = self.mean_departure_rate
             for _ in range(service_arrivals):
-                possible_vehicles = list(filter(
-                    lambda v: v.allotted_fog_node is None, self.mobility_model.vehicles.values()))
+                possible_vehicles = self.mobility_model.vehicle_table.get_unallotted_vehicles()
                 if len(possible_vehicles) != 0:
                     service = Service(
                         random.choice(possible_vehicles),
                         self.total_services,
                         random.uniform(*self.config["desired_data_rate"])
                     )
-                    allotted_node = self.allocation_policy.allocate(service)
+                    allotted_node = self._allocate(service)
+                    if not allotted_node and self.event_log is not None:
+                        self.event_log.log(
+                            env.now, REJECTION, service.id, service.vehicle.id)
                     if allotted_node:
                         self._service_node_mapping[service.id] = allotted_node
                         self.services[service.id] = service
@@ -131,8 +161,11 @@ class Simulation:
                     fn = self._service_node_mapping[service_id]
 
                     _ = self._service_node_mapping.pop(service_id)
-                    self.services.pop(service_id)
+                    service = self.services.pop(service_id)
                     fn.remove_service(fn.get_service(service_id))
+                    if self.event_log is not None:
+                        self.event_log.log(
+                            env.now, DEPARTURE, service_id, service.vehicle.id, source=fn.id)
         print(
             f'Stopping simulation as {self.total_services} services are served')
         if hasattr(self, 'metrics'):
@@ -140,6 +173,22 @@ class Simulation:
         self.is_stopped = True
         self.stop_simulation_event.succeed()
 
+    def _allocate(self, service):
+        if self.instrumentation is None:
+            return self.allocation_policy.allocate(service)
+        start = time.perf_counter()
+        allotted_node = self.allocation_policy.allocate(service)
+        self.instrumentation.record('allocation', time.perf_counter()-start)
+        if not allotted_node:
+            self.instrumentation.count('rejections')
+        return allotted_node
+
+    def get_instrumentation_stats(self):
+        """Returns the counters and timers of the hot paths, None unless instrumentation is enabled"""
+        if self.instrumentation is None:
+            return None
+        return self.instrumentation.get_stats()
+
     def set_service_node_mapping(self, service, fog_node):
         self._service_node_mapping[service.id] = fog_node
 
@@ -152,11 +201,29 @@ class Simulation:
 
         yield env.timeout(TIME_MULTIPLIER)
         while True:
-            self.orchestration_module.step()
+            if self.instrumentation is None:
+                self.orchestration_module.step()
+            else:
+                start = time.perf_counter()
+                self.orchestration_module.step()
+                self.instrumentation.record(
+                    'orchestration', time.perf_counter()-start)
             yield env.timeout(TIME_MULTIPLIER)
 
+    def close(self):
+        """Releases the worker pool and the event log, simulations that are stepped by hand must call it"""
+        self.orchestration_module.close()
+        if self.event_log is not None:
+            self.event_log.close()
+
     def run(self):
-        self.env.run(until=self.stop_simulation_event)
+        try:
+            self.env.run(until=self.stop_simulation_event)
+        finally:
+            self.close()
+            if self.instrumentation is not None and self.config.get("instrumentation_output"):
+                self.instrumentation.export(
+                    self.get_output_path("instrumentation_output"))
 
 
 # s = Simulation()
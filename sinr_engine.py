@@ -0,0 +1,127 @@
+import math
+import numpy as np
+from utils import distance
+from constants import TRANSMIT_POWER_FN2VEHICLE
+
+
+class SINREngine:
+    """
+    Computes distances, channel gains, interference and sinr between fog nodes
+    and vehicles for all the node x vehicle pairs in one batched call
+    """
+
+    PATH_LOSS_EXPONENT = 3.5
+    INTERFERENCE_FACTOR = 0.5
+
+    def __init__(self, fog_nodes):
+        self.fog_nodes = fog_nodes
+        self.node_positions = np.array(
+            [fog_node.position for fog_node in fog_nodes], dtype=float)
+        self.coverage_radius = np.array(
+            [fog_node.coverage_radius for fog_node in fog_nodes], dtype=float)
+        self.noise = np.array(
+            [fog_node.sigma**2 for fog_node in fog_nodes], dtype=float)
+        self.capacity = np.array(
+            [fog_node.capacity for fog_node in fog_nodes], dtype=float)
+        for fog_node in fog_nodes:
+            fog_node.sinr_engine = self
+
+    def _node_index(self, nodes):
+        return np.fromiter((fog_node.id for fog_node in nodes), dtype=int, count=len(nodes))
+
+    @staticmethod
+    def get_positions(vehicles):
+        """Returns the positions of the given vehicles as an array of shape (len(vehicles), 2)"""
+        if vehicles:
+            table = vehicles[0].table
+            rows = [vehicle.row for vehicle in vehicles if vehicle.table is table]
+            if len(rows) == len(vehicles):
+                return table.positions[rows]
+        return np.array([vehicle.get_position() for vehicle in vehicles], dtype=float).reshape(-1, 2)
+
+    @staticmethod
+    def get_distances(a, b):
+        """Returns the matrix of distances between every row of a and every row of b"""
+        dx = b[np.newaxis, :, 0] - a[:, np.newaxis, 0]
+        dy = b[np.newaxis, :, 1] - a[:, np.newaxis, 1]
+        return np.sqrt(dx**2 + dy**2)
+
+    @staticmethod
+    def get_channel_gains(distances):
+        return 1/(distances+0.00001)**SINREngine.PATH_LOSS_EXPONENT
+
+    @staticmethod
+    def get_channel_gain(a, b):
+        """Returns the channel gain between two positions"""
+        return 1/(distance(a, b)+0.00001)**SINREngine.PATH_LOSS_EXPONENT
+
+    def get_coverage_matrix(self, nodes, vehicles):
+        """Returns a boolean matrix which is true if the vehicle is in the coverage radius of the node"""
+        idx = self._node_index(nodes)
+        distances = self.get_distances(
+            self.node_positions[idx], self.get_positions(vehicles))
+        return distances < self.coverage_radius[idx, np.newaxis]
+
+    def get_interference(self, nodes):
+        """Returns the interference caused by all the services attached to each of the given nodes"""
+        return np.fromiter((fog_node.get_interference() for fog_node in nodes),
+                           dtype=float, count=len(nodes))
+
+    def get_sinr_matrix(self, nodes, vehicles):
+        """
+        Returns the signal to interference plus noise ratio of every
+        vehicle (columns) with respect to every node (rows)
+        """
+        idx = self._node_index(nodes)
+        gains = self.get_channel_gains(self.get_distances(
+            self.node_positions[idx], self.get_positions(vehicles)))
+        interference = np.repeat(self.get_interference(nodes)[:, np.newaxis],
+                                 len(vehicles), axis=1)
+        # A vehicle does not interfere with its own service, which is only
+        # attached to the fog node the vehicle is allotted to
+        rows = {fog_node.id: row for row, fog_node in enumerate(nodes)}
+        for col, vehicle in enumerate(vehicles):
+            fog_node = vehicle.allotted_fog_node
+            if fog_node is None or vehicle.id not in fog_node._attached_gains:
+                continue
+            row = rows.get(fog_node.id)
+            if row is not None:
+                interference[row, col] = fog_node.get_interference(vehicle)
+        signal = TRANSMIT_POWER_FN2VEHICLE*gains
+        return signal/(self.noise[idx, np.newaxis] + interference)
+
+    @staticmethod
+    def get_resource_blocks(sinr, service, capacity):
+        """
+        Returns the resource blocks required by the service for the given sinr.
+        If the spectral efficiency is zero the capacity is returned so that
+        the service is rejected
+        """
+        spectral_efficiency = math.log2(1+sinr)
+        if spectral_efficiency == 0:
+            return capacity
+        return int(service.desired_data_rate * 1000 /
+                   (180*spectral_efficiency))
+
+    def get_resource_blocks_matrix(self, nodes, services):
+        """
+        Returns the resource blocks required by every service (columns) at every node (rows).
+        If the spectral efficiency is zero the capacity of the node is returned so that
+        the service is rejected
+        """
+        idx = self._node_index(nodes)
+        sinr = self.get_sinr_matrix(nodes, [service.vehicle for service in services])
+        spectral_efficiency = np.log2(1+sinr)
+        rates = np.array(
+            [service.desired_data_rate for service in services], dtype=float)
+        with np.errstate(divide='ignore'):
+            blocks = np.trunc(rates*1000/(180*spectral_efficiency))
+        return np.where(spectral_efficiency == 0, self.capacity[idx, np.newaxis], blocks)
+
+    def on_vehicle_moved(self, vehicle):
+        if vehicle.allotted_fog_node is not None:
+            vehicle.allotted_fog_node.on_vehicle_moved(vehicle)
+
+    def on_vehicle_departed(self, vehicle):
+        for fog_node in self.fog_nodes:
+            fog_node.forget_vehicle(vehicle.id)
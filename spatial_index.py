@@ -0,0 +1,94 @@
+import math
+import numpy as np
+from utils import distance
+
+
+class SpatialGrid:
+    """Uniform grid that maps square cells of a fixed size to the objects inside them"""
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def get_cell(self, position):
+        return (math.floor(position[0]/self.cell_size), math.floor(position[1]/self.cell_size))
+
+    def get_cells_in_range(self, position, radius):
+        """Yields all the cells that overlap the square bounding the circle of the given radius"""
+        x0, y0 = self.get_cell((position[0]-radius, position[1]-radius))
+        x1, y1 = self.get_cell((position[0]+radius, position[1]+radius))
+        for x in range(x0, x1+1):
+            for y in range(y0, y1+1):
+                yield (x, y)
+
+
+class FogNodeIndex:
+    """Spatial index that maps every cell to the fog nodes whose coverage radius overlaps it"""
+
+    def __init__(self, fog_nodes, cell_size=None):
+        if cell_size is None:
+            cell_size = max(fog_node.coverage_radius for fog_node in fog_nodes)
+        self.grid = SpatialGrid(cell_size)
+        for fog_node in fog_nodes:
+            for cell in self.grid.get_cells_in_range(fog_node.position, fog_node.coverage_radius):
+                self.grid.cells.setdefault(cell, []).append(fog_node)
+        self.neighbors = self.get_coverage_overlaps(fog_nodes)
+
+    @staticmethod
+    def get_coverage_overlaps(fog_nodes):
+        """
+        Returns for every fog node id the ids of the fog nodes after it whose
+        coverage disc intersects its own, in increasing order
+        """
+        positions = np.array([fog_node.position for fog_node in fog_nodes], dtype=float)
+        radii = np.array([fog_node.coverage_radius for fog_node in fog_nodes], dtype=float)
+        distances = np.linalg.norm(positions[:, None, :]-positions[None, :, :], axis=2)
+        overlaps = np.triu(distances < radii[:, None]+radii[None, :], k=1)
+        return {fog_node.id: [fog_nodes[col].id for col in np.nonzero(overlaps[row])[0]]
+                for row, fog_node in enumerate(fog_nodes)}
+
+    def find_feasible_fog_nodes(self, vehicle):
+        """Finds all the fog nodes that can reach the vehicle of the service"""
+        position = vehicle.get_position()
+        return [fog_node for fog_node in self.grid.cells.get(self.grid.get_cell(position), ())
+                if distance(fog_node.position, position) < fog_node.coverage_radius]
+
+
+class VehicleIndex:
+    """Spatial index over vehicle positions that is kept up to date as vehicles move"""
+
+    def __init__(self, cell_size):
+        self.grid = SpatialGrid(cell_size)
+        self._vehicle_cells = {}
+
+    def on_vehicle_moved(self, vehicle):
+        if not vehicle.in_network:
+            return
+        cell = self.grid.get_cell(vehicle.get_position())
+        old_cell = self._vehicle_cells.get(vehicle.id)
+        if old_cell == cell:
+            return
+        if old_cell is not None:
+            self._remove(vehicle.id, old_cell)
+        self.grid.cells.setdefault(cell, {})[vehicle.id] = vehicle
+        self._vehicle_cells[vehicle.id] = cell
+
+    def on_vehicle_departed(self, vehicle):
+        cell = self._vehicle_cells.pop(vehicle.id, None)
+        if cell is not None:
+            self._remove(vehicle.id, cell)
+
+    def _remove(self, vehicle_id, cell):
+        vehicles = self.grid.cells[cell]
+        del vehicles[vehicle_id]
+        if not vehicles:
+            del self.grid.cells[cell]
+
+    def find_vehicles(self, fog_node):
+        """Returns all the vehicles that are in the coverage radius of the given fog_node"""
+        possible_vehicles = []
+        for cell in self.grid.get_cells_in_range(fog_node.position, fog_node.coverage_radius):
+            for vehicle in self.grid.cells.get(cell, {}).values():
+                if distance(fog_node.position, vehicle.get_position()) < fog_node.coverage_radius:
+                    possible_vehicles.append(vehicle)
+        return possible_vehicles
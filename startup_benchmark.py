@@ -0,0 +1,44 @@
+import json
+import subprocess
+import sys
+
+# Backends that only RL orchestration needs
+HEAVY_MODULES = ["tensorflow", "stable_baselines", "gym", "pandas"]
+
+# Runs in a fresh interpreter so that nothing is imported beforehand
+CONSTRUCT = """
+import json, sys, time
+start = time.time()
+from simulation import Simulation
+imported = time.time()
+Simulation(config=sys.argv[1])
+constructed = time.time()
+print(json.dumps({
+    "import": imported-start,
+    "construct": constructed-imported,
+    "modules": [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+def measure_startup(config):
+    """Returns the seconds to import simulation and construct a Simulation of the config, and the heavy modules it imported"""
+    output = subprocess.run(
+        [sys.executable, "-c", CONSTRUCT % HEAVY_MODULES, config],
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    configs = sys.argv[1:] or ['sa', 'caa', 'coa', 'sa_dro', 'caa_dro', 'coa_dro']
+    for config in configs:
+        path = config if config.endswith('.json') else f'./configs/{config}.json'
+        with open(path) as f:
+            scheme = json.load(f).get("orchestration_scheme", None)
+        result = measure_startup(path)
+        print(f'{config:>10}: import {1000*result["import"]:8.1f} ms, '
+              f'construct {1000*result["construct"]:8.1f} ms, '
+              f'heavy modules {result["modules"]}')
+        if scheme != 'rl':
+            assert "tensorflow" not in result["modules"], \
+                f'Constructing a {config} simulation imported TensorFlow'
@@ -0,0 +1,113 @@
+import json
+import os
+import random
+import sys
+import pytest
+import numpy as np
+import simpy
+
+# The modules of the simulator live at the root of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from constants import CACHE_CONTENT_TYPES
+from fognode import Node
+from simulation import Simulation
+from vehicle import Vehicle, VehicleTable, Service
+
+
+class World:
+    """Fog nodes and vehicles at random positions, without the processes of a Simulation"""
+
+    def __init__(self, seed, n_nodes=5, n_vehicles=40, size=1000, ledger=True):
+        self.rng = random.Random(seed)
+        self.size = size
+        self.env = simpy.Environment()
+        self.nodes = []
+        for idx in range(n_nodes):
+            node = Node(idx, self.env, self.rng.randint(100, 500), 20,
+                        [self.rng.choice([0, 1]) for _ in range(CACHE_CONTENT_TYPES)],
+                        ledger=ledger)
+            node.set_position(*self.random_position())
+            self.nodes.append(node)
+        self.table = VehicleTable()
+        self.vehicles = []
+        for vehicle_id in range(n_vehicles):
+            vehicle = Vehicle(vehicle_id, self.env, 1, table=self.table)
+            vehicle.set_position(self.random_position())
+            self.vehicles.append(vehicle)
+
+    def random_position(self):
+        return (self.rng.uniform(0, self.size), self.rng.uniform(0, self.size))
+
+    def add_services(self, count):
+        """Serves the first count vehicles, each at a random fog node, and returns their services"""
+        services = []
+        for vehicle in self.vehicles[:count]:
+            service = Service(vehicle, vehicle.id, self.rng.uniform(0.5, 2))
+            self.rng.choice(self.nodes).add_service(service)
+            services.append(service)
+        return services
+
+
+@pytest.fixture
+def make_world():
+    return World
+
+
+@pytest.fixture
+def make_simulation(tmp_path, monkeypatch):
+    """Returns a function that builds a Simulation of one of the configs with overrides under a seed"""
+    monkeypatch.chdir(ROOT)
+
+    def make(name, seed, total_service_connections=300, **overrides):
+        with open(os.path.join(ROOT, 'configs', f'{name}.json')) as f:
+            config = json.load(f)
+        config["total_service_connections"] = total_service_connections
+        config.update(overrides)
+        path = tmp_path / f'{name}_{seed}.json'
+        path.write_text(json.dumps(config))
+        random.seed(seed)
+        np.random.seed(seed)
+        return Simulation(config=str(path))
+    return make
+
+
+@pytest.fixture
+def run_simulation(make_simulation):
+    """Returns a function that runs one of the configs with overrides under a seed and returns the Simulation"""
+    def run(name, seed, **overrides):
+        sim = make_simulation(name, seed, **overrides)
+        sim.run()
+        return sim
+    return run
+
+class Trace:
+    """
+    Mobility trace of vehicles that arrive at random frames, the k-th record
+    of vehicle v is at (1000*v + k, v + 0.5)
+    """
+
+    def __init__(self, seed, n_vehicles=60, last_arrival=20, max_length=15):
+        rng = random.Random(seed)
+        self.arrivals = {v: rng.randint(0, last_arrival) for v in range(n_vehicles)}
+        self.lengths = {v: rng.randint(1, max_length) for v in range(n_vehicles)}
+        self.records = [(self.arrivals[v]+k, v, self.get_position(v, k))
+                        for v in range(n_vehicles) for k in range(self.lengths[v])]
+        rng.shuffle(self.records)
+
+    @staticmethod
+    def get_position(vehicle_id, k):
+        return (1000.0*vehicle_id + k, vehicle_id + 0.5)
+
+    def write(self, path):
+        with open(path, "w") as f:
+            f.write("Vehicle_ID,Frame_ID,Lane_ID,Global_X,Global_Y\n")
+            for frame_id, vehicle_id, (x, y) in self.records:
+                f.write(f"{vehicle_id},{frame_id},1,{x},{y}\n")
+        return str(path)
+
+
+@pytest.fixture
+def make_trace():
+    return Trace
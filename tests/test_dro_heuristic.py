@@ -0,0 +1,145 @@
+import itertools
+import math
+import random
+import numpy as np
+import pytest
+from optimization_solver import OptimizationSolver
+from orchestration import DROHeuristic
+
+
+class Pair(DROHeuristic):
+    """
+    Fog nodes 0 and 1 with random resource blocks for n vehicles that are
+    each served by one of them, and at most free resource blocks left
+    """
+
+    def __init__(self, seed, n, free=60, **settings):
+        rng = random.Random(seed)
+        self.GAMMA = 1000
+        self.solver = OptimizationSolver()
+        self.step_rule = "constant"
+        self.gap_tolerance = None
+        self.max_iterations = None
+        self.warm_start = False
+        self.instrumentation = None
+        self.__dict__.update(settings)
+        self.multipliers = {}
+        self.pair_stats = {}
+        self.vehicles = list(range(n))
+        self.b = {(fn_id, k): rng.randint(1, 60) for fn_id in (0, 1) for k in self.vehicles}
+        self.D = {0: set(), 1: set()}
+        for k in self.vehicles:
+            self.D[rng.randint(0, 1)].add(k)
+        self.levels = [rng.randint(0, free), rng.randint(0, free)]
+        self.D_star = {}
+        self.d_star = {}
+        self.W = {}
+
+    def run(self):
+        self.compute_heuristic(0, 1, self.vehicles)
+        return self.W.get((0, 1)), self.d_star.get((0, 1)), self.d_star.get((1, 0))
+
+    def get_optimal_cost(self):
+        """Returns the fewest resource blocks of an allocation of every vehicle within the capacities, by brute force"""
+        capacity = [self.get_capacity(fn_id, self.vehicles) for fn_id in (0, 1)]
+        best = None
+        for fn_ids in itertools.product((0, 1), repeat=len(self.vehicles)):
+            load = [0, 0]
+            for k, fn_id in zip(self.vehicles, fn_ids):
+                load[fn_id] += self.b[(fn_id, k)]
+            if load[0] <= capacity[0] and load[1] <= capacity[1]:
+                cost = sum(load)
+                best = cost if best is None else min(best, cost)
+        return best
+
+
+def original_heuristic(pair):
+    """The subgradient loop of DRO before the step rules and bounds, returns the allocation it ends with"""
+    u = [0]*len(pair.vehicles)
+    new_x = None
+    patience = 1000000/pair.GAMMA
+    eps = 2*math.sqrt(len(pair.vehicles))
+    old_du = 0
+    while patience >= 0:
+        new_x = pair.solve_knapsack(u, 0, 1, pair.vehicles)
+        du = pair.get_gradient(new_x, 0, 1, pair.vehicles)
+        for k in range(len(u)):
+            u[k] = u[k] + pair.GAMMA * du[k]
+        if old_du == du:
+            patience -= 1
+        else:
+            patience = 1000000/pair.GAMMA
+        if np.linalg.norm(du) >= eps:
+            break
+        old_du = du
+    return new_x
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_default_settings_match_original_loop(seed):
+    pair = Pair(seed, 6)
+    new_x = original_heuristic(pair)
+    W, dij_star, dji_star = pair.run()
+    if not new_x:
+        assert W is None
+        return
+    assert dij_star == pair.D[0].difference(pair.get_D_star(0, new_x))
+    assert dji_star == pair.D[1].difference(pair.get_D_star(1, new_x))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_dual_bound_is_a_lower_bound(seed):
+    pair = Pair(seed, 6)
+    optimum = pair.get_optimal_cost()
+    if optimum is None:
+        pytest.skip("the pair cannot hold every vehicle")
+    rng = random.Random(seed)
+    for _ in range(10):
+        u = [rng.uniform(0, 120) for _ in pair.vehicles]
+        dual_bound, x = pair.get_dual_bound(u, 0, 1, pair.vehicles)
+        assert dual_bound <= optimum + 1e-9
+        allocation = pair.get_feasible_allocation(x, 0, 1, pair.vehicles)
+        if allocation is not None:
+            assert sorted(k for _, k in allocation) == pair.vehicles
+            assert sum(pair.b[key] for key in allocation) >= optimum
+
+
+@pytest.mark.parametrize("step_rule", ["constant", "diminishing", "adaptive", "polyak"])
+@pytest.mark.parametrize("seed", range(40))
+def test_closed_gap_is_optimal(seed, step_rule):
+    # Pairs with little room left stall and are bounded
+    pair = Pair(seed, 6, free=5, step_rule=step_rule, gap_tolerance=0)
+    pair.run()
+    gap = pair.pair_stats[(0, 1)]["last_gap"]
+    if gap is None or gap > 0:
+        return
+    allocation = {(0, k) for k in pair.D_star[0]}.union({(1, k) for k in pair.D_star[1]})
+    assert sum(pair.b[key] for key in allocation) == pair.get_optimal_cost()
+    assert pair.W[(0, 1)] >= 0
+
+
+@pytest.mark.parametrize("step_rule", ["constant", "diminishing", "adaptive", "polyak"])
+def test_some_gaps_close(step_rule):
+    gaps = []
+    for seed in range(40):
+        pair = Pair(seed, 6, free=5, step_rule=step_rule, gap_tolerance=0)
+        pair.run()
+        gaps.append(pair.pair_stats[(0, 1)]["last_gap"])
+    assert any(gap is not None and gap <= 0 for gap in gaps)
+
+
+@pytest.mark.parametrize("max_iterations", [1, 3])
+def test_max_iterations(max_iterations):
+    for seed in range(10):
+        pair = Pair(seed, 6, max_iterations=max_iterations, gap_tolerance=0.1)
+        pair.run()
+        assert pair.pair_stats[(0, 1)]["last_iterations"] <= max_iterations
+
+
+def test_warm_start_begins_a_step_back():
+    pair = Pair(1, 6, warm_start=True)
+    assert pair.get_initial_multipliers(0, 1, pair.vehicles) == [0]*6
+    pair.run()
+    last_u = pair.multipliers[(0, 1)]
+    assert pair.get_initial_multipliers(0, 1, pair.vehicles) == [
+        max(0, last_u[k]-pair.GAMMA) for k in pair.vehicles]
@@ -0,0 +1,100 @@
+import json
+import os
+import random
+import pytest
+import monte_carlo
+from event_log import (ALLOCATION, EVENT_TYPES, HEADER_DTYPE, MIGRATION, NO_NODE,
+                       ROW_DTYPE, EventLog, load_event_log)
+
+
+def random_events(seed, count):
+    rng = random.Random(seed)
+    return [(rng.uniform(0, 1e6), rng.randrange(len(EVENT_TYPES)), rng.randrange(10**9),
+             rng.randrange(10**6), rng.randrange(-1, 36), rng.randrange(-1, 36))
+            for _ in range(count)]
+
+
+@pytest.mark.parametrize("count", [0, 1, 7, 8, 100])
+def test_round_trip(tmp_path, count):
+    path = str(tmp_path / "events.bin")
+    events = random_events(count, count)
+    # Blocks of 8 rows in a ring of 2 make the log wait for the writer
+    log = EventLog(path, block_rows=8, blocks=2)
+    for event in events:
+        log.log(*event)
+    log.close()
+    columns = load_event_log(path)
+    assert list(zip(*(columns[name].tolist() for name in ROW_DTYPE.names))) == events
+
+
+def test_source_and_target_default_to_no_node(tmp_path):
+    path = str(tmp_path / "events.bin")
+    log = EventLog(path)
+    log.log(1.0, ALLOCATION, 3, 4, target=5)
+    log.log(2.0, MIGRATION, 3, 4, source=5, target=6)
+    log.close()
+    columns = load_event_log(path)
+    assert columns["source"].tolist() == [NO_NODE, 5]
+    assert columns["target"].tolist() == [5, 6]
+
+
+def test_log_after_close_raises(tmp_path):
+    log = EventLog(str(tmp_path / "events.bin"))
+    log.log(1.0, ALLOCATION, 1, 1)
+    log.close()
+    log.close()
+    with pytest.raises(ValueError):
+        log.log(2.0, ALLOCATION, 2, 2)
+    assert len(load_event_log(log.path)["time"]) == 1
+
+
+def test_partial_row_is_ignored(tmp_path):
+    path = str(tmp_path / "events.bin")
+    log = EventLog(path)
+    for event in random_events(1, 3):
+        log.log(*event)
+    log.close()
+    with open(path, "ab") as f:
+        f.write(b"\0"*(ROW_DTYPE.itemsize//2))
+    assert len(load_event_log(path)["time"]) == 3
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = str(tmp_path / "events.bin")
+    with open(path, "wb") as f:
+        f.write(b"time,type\n")
+    with pytest.raises(ValueError):
+        load_event_log(path)
+    log = EventLog(path)
+    log.close()
+    with open(path, "r+b") as f:
+        f.seek(HEADER_DTYPE.fields["version"][1])
+        f.write((99).to_bytes(4, "little"))
+    with pytest.raises(ValueError):
+        load_event_log(path)
+
+
+def test_simulation_logs_its_services(run_simulation, tmp_path):
+    path = str(tmp_path / "events.bin")
+    sim = run_simulation("caa_dro", 1, event_log=path)
+    assert sim.event_log.closed
+    columns = load_event_log(path)
+    assert (columns["type"] == ALLOCATION).sum() == sim.aggregates.incoming_services
+    assert (columns["type"] == MIGRATION).any()
+    assert (columns["time"][1:] >= columns["time"][:-1]).all()
+
+
+def test_monte_carlo_runs_log_to_files_of_their_own(tmp_path, monkeypatch):
+    monkeypatch.chdir(os.path.dirname(monte_carlo.__file__))
+    with open(monte_carlo.get_config_path("sa")) as f:
+        config = json.load(f)
+    config["total_service_connections"] = 100
+    config["event_log"] = str(tmp_path / "events.bin")
+    config_path = tmp_path / "small_sa.json"
+    config_path.write_text(json.dumps(config))
+    for seed in (1, 2):
+        monte_carlo.run_simulation((str(config_path), seed))
+    assert not os.path.exists(config["event_log"])
+    for seed in (1, 2):
+        columns = load_event_log(str(tmp_path / f"events_small_sa_{seed}.bin"))
+        assert (columns["type"] == ALLOCATION).any()
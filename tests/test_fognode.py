@@ -0,0 +1,66 @@
+import pytest
+from constants import TRANSMIT_POWER_FN2VEHICLE
+from utils import distance
+
+
+def reference_interference(fog_node, vehicle=None):
+    """The interference summed over the services of the fog node the way it was before the running total"""
+    interference = 0
+    for vehicle_service in fog_node.get_vehicle_services().values():
+        other = vehicle_service["service"].vehicle
+        if vehicle is None or other.id != vehicle.id:
+            interference += 0.5*TRANSMIT_POWER_FN2VEHICLE * \
+                1/(distance(fog_node.position, other.get_position())+0.00001)**3.5
+    return interference
+
+
+def check_interference(world):
+    for fog_node in world.nodes:
+        assert fog_node.get_interference() == pytest.approx(reference_interference(fog_node))
+        for vehicle in world.vehicles:
+            assert fog_node.get_interference(vehicle) == pytest.approx(
+                reference_interference(fog_node, vehicle), abs=1e-12)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_interference_follows_services_and_moves(make_world, seed):
+    world = make_world(seed)
+    services = world.add_services(30)
+    world.env.run()
+    check_interference(world)
+    for step in range(5):
+        for service in services:
+            fog_node = service.vehicle.allotted_fog_node
+            roll = world.rng.random()
+            if fog_node is None:
+                if roll < 0.5:
+                    world.rng.choice(world.nodes).add_service(service)
+            elif roll < 0.2:
+                fog_node.remove_service(service)
+            else:
+                service.vehicle.set_position(world.random_position())
+                fog_node.on_vehicle_moved(service.vehicle)
+        world.env.run()
+        check_interference(world)
+
+
+def test_interference_is_zero_without_services(make_world):
+    world = make_world(1)
+    services = world.add_services(20)
+    world.env.run()
+    for service in services:
+        # Services rejected for too few resource blocks are no longer allotted
+        if service.vehicle.allotted_fog_node is not None:
+            service.vehicle.allotted_fog_node.remove_service(service)
+    world.env.run()
+    for fog_node in world.nodes:
+        assert fog_node.get_interference() == 0
+
+
+def test_channel_gain_follows_position(make_world):
+    world = make_world(1)
+    fog_node, vehicle = world.nodes[0], world.vehicles[0]
+    for _ in range(3):
+        assert fog_node._get_channel_gain(vehicle) == pytest.approx(
+            1/(distance(fog_node.position, vehicle.get_position())+0.00001)**3.5)
+        vehicle.set_position(world.random_position())
@@ -0,0 +1,62 @@
+import itertools
+import random
+import pytest
+from matching import BlossomMatching, GreedyMatching
+
+
+def max_rebuild_matching(W):
+    """The selection DRO used before the matching algorithms: take the max, rebuild W without its fog nodes"""
+    phi = set()
+    while W:
+        edge = max(W, key=W.get)
+        phi.add(edge)
+        W = {key: weight for key, weight in W.items()
+             if not (edge[0] in key or edge[1] in key)}
+    return phi
+
+
+def random_weights(seed, n_nodes=12, density=0.4, ties=False):
+    rng = random.Random(seed)
+    W = {}
+    for i, j in itertools.combinations(range(n_nodes), 2):
+        if rng.random() < density:
+            W[(i, j)] = rng.randint(-3, 5) if ties else rng.uniform(-10, 100)
+    items = list(W.items())
+    rng.shuffle(items)
+    return dict(items)
+
+
+def is_matching(phi, W):
+    nodes = [node for edge in phi for node in edge]
+    return len(nodes) == len(set(nodes)) and all(edge in W for edge in phi)
+
+
+@pytest.mark.parametrize("ties", [False, True])
+@pytest.mark.parametrize("seed", range(30))
+def test_greedy_matches_max_rebuild(seed, ties):
+    W = random_weights(seed, ties=ties)
+    assert GreedyMatching().match(W) == max_rebuild_matching(dict(W))
+
+
+def test_greedy_of_no_pairs():
+    assert GreedyMatching().match({}) == set()
+
+
+def best_matching_weight(W):
+    """Brute force over all the subsets of the pairs with a positive weight"""
+    edges = [edge for edge, weight in W.items() if weight > 0]
+    best = 0
+    for r in range(len(edges)+1):
+        for phi in itertools.combinations(edges, r):
+            if is_matching(phi, W):
+                best = max(best, sum(W[edge] for edge in phi))
+    return best
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_blossom_is_a_maximum_weight_matching(seed):
+    pytest.importorskip("networkx")
+    W = random_weights(seed, n_nodes=7)
+    phi = BlossomMatching().match(W)
+    assert is_matching(phi, W)
+    assert sum(W[edge] for edge in phi) == pytest.approx(best_matching_weight(W))
@@ -0,0 +1,46 @@
+import pytest
+
+
+def walk_nodes(fog_nodes):
+    """The metrics the way they were computed by walking all the fog nodes every tick"""
+    served = sum(node.get_serviceability_metrics()[0] for node in fog_nodes)
+    incoming = sum(node.get_serviceability_metrics()[1] for node in fog_nodes)
+    energy = sum(node.energy_consumed for node in fog_nodes)
+    return {
+        "service_capability": sum(node.resource_container.level for node in fog_nodes) /
+        sum(node.capacity for node in fog_nodes),
+        "throughput": sum(node.overall_throughput for node in fog_nodes),
+        "serviceability": served/incoming if incoming else 1,
+        "availability": served/incoming if incoming else 1,
+        "energy_consumed": energy,
+        "avg_energy_consumed": energy/served if served else energy,
+    }
+
+
+@pytest.mark.parametrize("ledger", [False, True])
+@pytest.mark.parametrize("name", ["sa", "coa_dro"])
+def test_aggregates_match_walking_the_nodes(make_simulation, name, ledger):
+    names = ["service_capability", "throughput", "serviceability",
+             "availability", "energy_consumed", "avg_energy_consumed"]
+    sim = make_simulation(name, 1, metrics=names, resource_ledger=ledger)
+    expected = []
+    compute = sim.metrics.compute
+
+    def compute_and_walk():
+        compute()
+        expected.append(walk_nodes(sim.fog_nodes))
+    sim.metrics.compute = compute_and_walk
+    sim.run()
+    metrics = sim.get_metrics()
+    assert len(expected) > 10
+    for name in names:
+        assert metrics[name] == pytest.approx([values[name] for values in expected], rel=1e-12)
+
+
+def test_values_grow_past_the_initial_capacity(make_simulation):
+    sim = make_simulation("sa", 1, metrics=["throughput"])
+    sim.metrics._values = sim.metrics._values[:, :2]
+    sim.run()
+    assert len(sim.get_metrics()["throughput"]) > 2
+    assert sim.metrics.get_values("throughput").tolist() == sim.get_metrics()["throughput"]
+
@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+from mobility_model import DynamicMobilityModel
+
+
+class Listener:
+
+    def __init__(self):
+        self.moved = set()
+        self.departed = []
+
+    def on_vehicle_moved(self, vehicle):
+        self.moved.add(vehicle.id)
+
+    def on_vehicle_departed(self, vehicle):
+        self.departed.append(vehicle.id)
+
+
+def test_dynamic_model_follows_trajectories_across_compactions(make_trace, tmp_path):
+    trace = make_trace(1)
+    model = DynamicMobilityModel(trace.write(tmp_path / "trace.csv"),
+                                 {"desired_data_rate": 1, "trace_cache_dir": str(tmp_path / "cache")})
+    listener = Listener()
+    model.add_listener(listener)
+    compactions = []
+    on_table_compacted = model.on_table_compacted
+    model.on_table_compacted = lambda rows: compactions.append(
+        rows) or on_table_compacted(rows)
+    env = SimpleNamespace(now=0)
+    vehicles = {}
+    for frame_id in range(40):
+        env.now = frame_id*DynamicMobilityModel.FRAME_PERIOD
+        model.update_vehicles(env, frame_id)
+        model.advance(env.now)
+        vehicles.update(model.vehicles)
+        for vehicle_id, vehicle in vehicles.items():
+            k = frame_id - trace.arrivals[vehicle_id]
+            if k < trace.lengths[vehicle_id]:
+                assert vehicle_id in model.vehicles
+                assert vehicle.get_position() == trace.get_position(vehicle_id, k)
+            else:
+                assert vehicle_id not in model.vehicles and not vehicle.in_network
+                assert vehicle.get_position() == (-1, -1)
+    assert compactions
+    assert sorted(listener.departed) == sorted(vehicles) == list(range(len(trace.arrivals)))
+    assert model.vehicle_table.size == 0
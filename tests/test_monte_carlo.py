@@ -0,0 +1,62 @@
+import json
+import os
+import numpy as np
+import pytest
+import monte_carlo
+from monte_carlo import aggregate, run_monte_carlo, run_simulation
+
+
+@pytest.fixture
+def configs(tmp_path):
+    """Writes small versions of two configs and returns their paths"""
+    paths = []
+    for name in ["sa", "caa_dro"]:
+        with open(os.path.join(os.path.dirname(monte_carlo.__file__), "configs", f"{name}.json")) as f:
+            config = json.load(f)
+        config["total_service_connections"] = 150
+        path = tmp_path / f"{name}.json"
+        path.write_text(json.dumps(config))
+        paths.append(str(path))
+    return paths
+
+
+def test_aggregate_series_of_different_lengths():
+    result = aggregate([[1, 2, 3], [3, 4], [5]])
+    assert result["count"] == [3, 2, 1]
+    assert result["mean"] == [3, 3, 3]
+    half_width = monte_carlo.CI_Z*np.std([1, 3, 5], ddof=1)/np.sqrt(3)
+    assert result["ci_low"][0] == pytest.approx(3-half_width)
+    assert result["ci_high"][0] == pytest.approx(3+half_width)
+    # A time step only one run reached has no spread
+    assert result["ci_low"][2] == result["ci_high"][2] == 3
+    assert result["p50"] == [3, 3, 3]
+    assert result["p5"][1] == pytest.approx(np.percentile([2, 4], 5))
+
+
+def test_pool_runs_match_serial_runs(configs, tmp_path):
+    output_dir = str(tmp_path / "out")
+    summary = run_monte_carlo(configs, [1, 2], output_dir, workers=2)
+    runs = monte_carlo.load_runs(f"{output_dir}/runs.jsonl")
+    assert sorted((run["config"], run["seed"]) for run in runs) == \
+        sorted((config, seed) for config in configs for seed in [1, 2])
+    for run in runs:
+        assert run["metrics"] == run_simulation((run["config"], run["seed"]))["metrics"]
+    for config in configs:
+        assert summary[config]["runs"] == 2
+        metrics = [run["metrics"] for run in runs if run["config"] == config]
+        for name in metrics[0]:
+            assert summary[config][name] == aggregate([m[name] for m in metrics])
+    with open(f"{output_dir}/summary.json") as f:
+        assert json.load(f) == json.loads(json.dumps(summary))
+
+
+def test_finished_runs_are_not_repeated(configs, tmp_path):
+    output_dir = str(tmp_path / "out")
+    run_monte_carlo(configs[:1], [1], output_dir, workers=1)
+    summary = run_monte_carlo(configs[:1], [1, 2], output_dir, workers=1)
+    with open(f"{output_dir}/runs.jsonl") as f:
+        assert len(f.readlines()) == 2
+    assert summary[configs[0]]["runs"] == 2
+    assert run_monte_carlo(configs[:1], [2], output_dir, workers=1)[configs[0]]["runs"] == 1
+    with open(f"{output_dir}/runs.jsonl") as f:
+        assert len(f.readlines()) == 2
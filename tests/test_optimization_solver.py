@@ -0,0 +1,68 @@
+import itertools
+import random
+import pytest
+from optimization_solver import KNAPSACK_SOLVERS, OptimizationSolver
+
+
+def brute_force(weights, values, capacity):
+    """Returns the best value of any subset of the items that fits the capacity"""
+    best = 0
+    for r in range(len(values)+1):
+        for subset in itertools.combinations(range(len(values)), r):
+            if sum(weights[i] for i in subset) <= capacity:
+                best = max(best, sum(values[i] for i in subset))
+    return best
+
+
+@pytest.fixture(params=list(KNAPSACK_SOLVERS))
+def solver(request):
+    if request.param == "ortools":
+        pytest.importorskip("ortools")
+    return OptimizationSolver(request.param)
+
+
+def check(solver, weights, values, capacity):
+    selected = solver.solve(weights, values, capacity)
+    assert sum(weights[i] for i in selected) <= capacity
+    assert sum(values[i] for i in selected) == pytest.approx(
+        brute_force(weights, values, capacity))
+    return selected
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_integer_weights_match_brute_force(solver, seed):
+    rng = random.Random(seed)
+    n = rng.randint(1, 10)
+    weights = [rng.randint(1, 30) for _ in range(n)]
+    values = [rng.uniform(0, 10) for _ in range(n)]
+    check(solver, weights, values, rng.randint(1, 60))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_float_weights_match_brute_force(solver, seed):
+    if isinstance(solver.backend, KNAPSACK_SOLVERS["dp"]):
+        pytest.skip("dynamic programming requires integer weights")
+    rng = random.Random(seed)
+    n = rng.randint(1, 10)
+    weights = [rng.uniform(0.5, 30) for _ in range(n)]
+    values = [rng.uniform(0, 10) for _ in range(n)]
+    check(solver, weights, values, rng.uniform(1, 60))
+
+
+def test_large_capacity_matches_brute_force(solver):
+    rng = random.Random(1)
+    weights = [rng.randint(1000, 50000) for _ in range(10)]
+    values = [rng.uniform(0, 10) for _ in range(10)]
+    check(solver, weights, values, 100000)
+
+
+def test_capacity_zero_selects_nothing(solver):
+    assert check(solver, [1, 2, 3], [5, 6, 7], 0) == set()
+
+
+def test_items_heavier_than_capacity_are_not_selected(solver):
+    assert check(solver, [11, 20, 35], [5, 6, 7], 10) == set()
+
+
+def test_no_items(solver):
+    assert solver.solve([], [], 10) == set()
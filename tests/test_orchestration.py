@@ -0,0 +1,44 @@
+import pytest
+from event_log import MIGRATION, load_event_log
+from spatial_index import FogNodeIndex
+
+
+def get_migrations(sim):
+    events = load_event_log(sim.event_log.path)
+    migrations = events["type"] == MIGRATION
+    return list(zip(*(events[name][migrations].tolist()
+                      for name in ("time", "service", "source", "target"))))
+
+
+@pytest.fixture
+def run_dro(run_simulation, tmp_path):
+    """Runs a DRO config with an event log and returns the simulation"""
+    def run(name, seed, **overrides):
+        return run_simulation(name, seed, event_log=str(tmp_path / f'events_{name}_{seed}.bin'),
+                              **overrides)
+    return run
+
+
+@pytest.mark.parametrize("name", ["sa_dro", "caa_dro"])
+def test_pruned_pairs_migrate_like_all_pairs(run_dro, monkeypatch, name):
+    pruned = run_dro(name, 1)
+    monkeypatch.setattr(FogNodeIndex, "get_coverage_overlaps", staticmethod(
+        lambda fog_nodes: {fn.id: [other.id for other in fog_nodes[fn.id+1:]] for fn in fog_nodes}))
+    everything = run_dro(name, 1)
+    assert sum(map(len, pruned.fog_node_index.neighbors.values())) < \
+        sum(map(len, everything.fog_node_index.neighbors.values()))
+    assert get_migrations(pruned)
+    assert get_migrations(pruned) == get_migrations(everything)
+    assert pruned.get_metrics() == everything.get_metrics()
+
+
+@pytest.mark.parametrize("name", ["sa_dro", "caa_dro", "coa_dro"])
+@pytest.mark.parametrize("seed", [1, 2])
+def test_incremental_migrates_like_full(run_dro, name, seed):
+    full = run_dro(name, seed)
+    incremental = run_dro(name, seed, incremental_orchestration=True)
+    assert get_migrations(full)
+    assert get_migrations(incremental) == get_migrations(full)
+    assert incremental.get_metrics() == full.get_metrics()
+    assert incremental.orchestration_module.pair_cache_hits > 0
+    assert full.orchestration_module.pair_cache_hits == 0
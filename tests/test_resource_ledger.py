@@ -0,0 +1,48 @@
+import math
+import pytest
+from constants import TIME_MULTIPLIER
+from vehicle import Service
+
+
+@pytest.mark.parametrize("name", ["sa", "caa", "coa", "sa_dro", "caa_dro", "coa_dro"])
+@pytest.mark.parametrize("seed", [1, 2])
+def test_ledger_matches_service_processes(run_simulation, name, seed):
+    processes = run_simulation(name, seed).get_metrics()
+    ledger = run_simulation(name, seed, resource_ledger=True).get_metrics()
+    assert ledger == processes
+
+
+def serve(world, arrival, residency):
+    """Serves one vehicle at the first fog node from arrival for residency and returns the node"""
+    fog_node = world.nodes[0]
+    service = Service(world.vehicles[0], 0, 1)
+    service.content_type = 0
+    service.vehicle.set_position(fog_node.position)
+
+    def drive(env):
+        yield env.timeout(arrival)
+        fog_node.add_service(service)
+        yield env.timeout(residency)
+        fog_node.remove_service(service)
+    world.env.process(drive(world.env))
+    return fog_node, service
+
+
+@pytest.mark.parametrize("ticks", [0, 0.5, 1, 3.5, 4])
+def test_ledger_charges_every_started_tick(make_world, ticks):
+    residency = ticks*TIME_MULTIPLIER
+    energy = []
+    for ledger in [False, True]:
+        world = make_world(1, ledger=ledger)
+        fog_node, service = serve(world, 2*TIME_MULTIPLIER, residency)
+        world.env.run(until=10*TIME_MULTIPLIER)
+        energy.append(fog_node.energy_consumed)
+    assert energy[1] == energy[0] == service.curr_power_consumed*math.ceil(ticks)
+
+
+def test_ledger_charges_live_services(make_world):
+    world = make_world(1, ledger=True)
+    fog_node, service = serve(world, 0, 100*TIME_MULTIPLIER)
+    for ticks in [0.5, 1, 2.5]:
+        world.env.run(until=ticks*TIME_MULTIPLIER)
+        assert fog_node.energy_consumed == service.curr_power_consumed*math.ceil(ticks)
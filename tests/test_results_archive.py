@@ -0,0 +1,80 @@
+import json
+import os
+import random
+import numpy as np
+import pytest
+from results_archive import MANIFEST, ResultsArchive, ResultsReader
+
+
+def random_runs(seed, configs=("sa", "caa_dro"), seeds=range(4)):
+    rng = random.Random(seed)
+    runs = []
+    for config in configs:
+        for run_seed in seeds:
+            metrics = {name: [rng.uniform(0, 100) for _ in range(rng.randint(0, 40))]
+                       for name in ("throughput", "serviceability", "energy_consumed")}
+            runs.append((config, run_seed, metrics))
+    rng.shuffle(runs)
+    return runs
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 50, 1 << 16])
+def test_round_trip(tmp_path, chunk_rows):
+    runs = random_runs(1)
+    with ResultsArchive(str(tmp_path), chunk_rows=chunk_rows) as archive:
+        for config, seed, metrics in runs:
+            archive.append(config, seed, metrics)
+    reader = ResultsReader(str(tmp_path))
+    for config, seed, metrics in runs:
+        # Series without values leave no rows behind
+        assert reader.get_metrics(config, seed) == {
+            name: values for name, values in metrics.items() if values}
+    assert reader.get_seeds("sa") == [0, 1, 2, 3]
+
+
+def test_series(tmp_path):
+    runs = random_runs(2)
+    with ResultsArchive(str(tmp_path), chunk_rows=50) as archive:
+        for config, seed, metrics in runs:
+            archive.append(config, seed, metrics)
+    reader = ResultsReader(str(tmp_path))
+    seeds, values = reader.get_series("caa_dro", "throughput")
+    series = {seed: metrics["throughput"] for config, seed, metrics in runs
+              if config == "caa_dro" and metrics["throughput"]}
+    assert seeds.tolist() == sorted(series)
+    assert values.shape[1] == max(map(len, series.values()))
+    for row, seed in enumerate(seeds.tolist()):
+        n = len(series[seed])
+        assert values[row, :n].tolist() == series[seed]
+        assert np.isnan(values[row, n:]).all()
+    rows = reader.select(metric="serviceability")
+    assert len(rows["value"]) == sum(len(metrics["serviceability"]) for _, _, metrics in runs)
+    assert (rows["metric"] == reader.metrics.index("serviceability")).all()
+
+
+def test_reopened_archive_appends(tmp_path):
+    first, second = random_runs(3, seeds=[0]), random_runs(4, configs=("coa", "sa"), seeds=[1])
+    for runs in (first, second):
+        with ResultsArchive(str(tmp_path)) as archive:
+            for config, seed, metrics in runs:
+                archive.append(config, seed, metrics)
+    reader = ResultsReader(str(tmp_path))
+    assert sorted(reader.configs) == ["caa_dro", "coa", "sa"]
+    assert len(reader.manifest["chunks"]) == 2
+    for config, seed, metrics in first + second:
+        assert reader.get_metrics(config, seed) == {
+            name: values for name, values in metrics.items() if values}
+    assert reader.get_seeds("sa") == [0, 1]
+
+
+def test_unknown_version_is_rejected(tmp_path):
+    with ResultsArchive(str(tmp_path)) as archive:
+        archive.append("sa", 0, {"throughput": [1.0]})
+    with open(os.path.join(tmp_path, MANIFEST)) as f:
+        manifest = json.load(f)
+    manifest["version"] += 1
+    with open(os.path.join(tmp_path, MANIFEST), "w") as f:
+        json.dump(manifest, f)
+    with pytest.raises(ValueError):
+        ResultsArchive(str(tmp_path))
+
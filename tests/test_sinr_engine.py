@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from constants import TRANSMIT_POWER_FN2VEHICLE
+from sinr_engine import SINREngine
+from utils import distance
+
+
+def reference_sinr(fog_node, vehicle):
+    """The sinr the way fog nodes computed it one vehicle at a time"""
+    gain = 1/(distance(fog_node.position, vehicle.get_position())+0.00001)**3.5
+    interference = 0
+    for vehicle_service in fog_node.get_vehicle_services().values():
+        other = vehicle_service["service"].vehicle
+        if other.id != vehicle.id:
+            interference += 0.5*TRANSMIT_POWER_FN2VEHICLE * \
+                1/(distance(fog_node.position, other.get_position())+0.00001)**3.5
+    return TRANSMIT_POWER_FN2VEHICLE*gain/(fog_node.sigma**2 + interference)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sinr_matrix_matches_scalar_sinr(make_world, seed):
+    world = make_world(seed)
+    world.add_services(25)
+    engine = SINREngine(world.nodes)
+    sinr = engine.get_sinr_matrix(world.nodes, world.vehicles)
+    assert sinr.shape == (len(world.nodes), len(world.vehicles))
+    for row, fog_node in enumerate(world.nodes):
+        for col, vehicle in enumerate(world.vehicles):
+            assert sinr[row, col] == pytest.approx(reference_sinr(fog_node, vehicle))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_resource_blocks_matrix_matches_scalar_resource_blocks(make_world, seed):
+    world = make_world(seed)
+    services = world.add_services(25)
+    engine = SINREngine(world.nodes)
+    nodes = world.nodes[1:4]
+    blocks = engine.get_resource_blocks_matrix(nodes, services)
+    for row, fog_node in enumerate(nodes):
+        for col, service in enumerate(services):
+            assert blocks[row, col] == SINREngine.get_resource_blocks(
+                reference_sinr(fog_node, service.vehicle), service, fog_node.capacity)
+
+
+def test_coverage_matrix(make_world):
+    world = make_world(1)
+    engine = SINREngine(world.nodes)
+    coverage = engine.get_coverage_matrix(world.nodes, world.vehicles)
+    expected = [[distance(fog_node.position, vehicle.get_position()) < fog_node.coverage_radius
+                 for vehicle in world.vehicles] for fog_node in world.nodes]
+    assert np.array_equal(coverage, expected)
+
+
+def test_positions_of_vehicles_in_different_tables(make_world):
+    world = make_world(1)
+    other = make_world(2)
+    vehicles = [world.vehicles[0], other.vehicles[0], world.vehicles[3]]
+    assert np.array_equal(SINREngine.get_positions(vehicles),
+                          [vehicle.get_position() for vehicle in vehicles])
+    assert SINREngine.get_positions([]).shape == (0, 2)
@@ -0,0 +1,49 @@
+import pytest
+from spatial_index import FogNodeIndex, VehicleIndex
+from utils import distance, find_feasible_fog_nodes, find_vehicles
+
+
+def ids(objects):
+    return sorted(obj.id for obj in objects)
+
+
+@pytest.mark.parametrize("cell_size", [None, 50, 333])
+@pytest.mark.parametrize("seed", range(3))
+def test_feasible_fog_nodes_match_linear_scan(make_world, seed, cell_size):
+    world = make_world(seed, n_nodes=12, n_vehicles=200)
+    index = FogNodeIndex(world.nodes, cell_size)
+    for vehicle in world.vehicles:
+        assert ids(index.find_feasible_fog_nodes(vehicle)) == \
+            ids(find_feasible_fog_nodes(world.nodes, vehicle))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_coverage_overlaps(make_world, seed):
+    world = make_world(seed, n_nodes=12)
+    overlaps = FogNodeIndex.get_coverage_overlaps(world.nodes)
+    for i, a in enumerate(world.nodes):
+        assert overlaps[a.id] == [
+            b.id for b in world.nodes[i+1:]
+            if distance(a.position, b.position) < a.coverage_radius+b.coverage_radius]
+
+
+@pytest.mark.parametrize("cell_size", [50, 200])
+@pytest.mark.parametrize("seed", range(3))
+def test_vehicles_in_range_follow_moves_and_departures(make_world, seed, cell_size):
+    world = make_world(seed, n_nodes=8, n_vehicles=200)
+    index = VehicleIndex(cell_size)
+    for vehicle in world.vehicles:
+        index.on_vehicle_moved(vehicle)
+    for step in range(5):
+        for vehicle in world.vehicles:
+            if not vehicle.in_network:
+                continue
+            if world.rng.random() < 0.1:
+                vehicle.in_network = False
+                index.on_vehicle_departed(vehicle)
+            else:
+                vehicle.set_position(world.random_position())
+                index.on_vehicle_moved(vehicle)
+        in_network = [vehicle for vehicle in world.vehicles if vehicle.in_network]
+        for fog_node in world.nodes:
+            assert ids(index.find_vehicles(fog_node)) == ids(find_vehicles(in_network, fog_node))
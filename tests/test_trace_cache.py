@@ -0,0 +1,51 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import trace_cache
+from trace_cache import load_trace
+
+
+@pytest.fixture
+def trace_path(make_trace, tmp_path):
+    return make_trace(1).write(tmp_path / "trace.csv")
+
+
+def test_trace_matches_csv(trace_path, tmp_path):
+    trace = load_trace(trace_path, str(tmp_path / "cache"))
+    df = pd.read_csv(trace_path)
+    order = np.lexsort((df["Frame_ID"], df["Vehicle_ID"]))
+    for name in trace_cache.COLUMNS:
+        assert isinstance(trace[name], np.memmap)
+        assert np.array_equal(trace[name], df[name].to_numpy()[order])
+    # Row points back at the record in the csv
+    assert np.array_equal(df["Global_X"].to_numpy()[trace["Row"]], trace["Global_X"])
+
+
+def test_trace_is_converted_once(trace_path, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    first = load_trace(trace_path, cache_dir)
+
+    def fail(*args):
+        raise AssertionError("converted again")
+    monkeypatch.setattr(trace_cache, "_convert", fail)
+    monkeypatch.setattr(trace_cache, "file_hash", fail)
+    second = load_trace(trace_path, cache_dir)
+    assert np.array_equal(first["Vehicle_ID"], second["Vehicle_ID"])
+
+
+def test_changed_trace_is_converted_again(make_trace, trace_path, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    load_trace(trace_path, cache_dir)
+    make_trace(2).write(trace_path)
+    stat = os.stat(trace_path)
+    os.utime(trace_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    trace = load_trace(trace_path, cache_dir)
+    df = pd.read_csv(trace_path)
+    assert np.array_equal(np.sort(trace["Global_X"]), np.sort(df["Global_X"].to_numpy()))
+    assert len([name for name in os.listdir(cache_dir) if name != trace_cache.DIGESTS]) == 2
+
+
+def test_default_cache_dir_is_next_to_the_trace(trace_path, tmp_path):
+    load_trace(trace_path)
+    assert os.path.isfile(os.path.join(tmp_path, ".trace_cache", trace_cache.DIGESTS))
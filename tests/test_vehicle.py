@@ -0,0 +1,84 @@
+import numpy as np
+from vehicle import Vehicle, VehicleTable
+
+
+def make_fleet(count, capacity=4):
+    table = VehicleTable(capacity=capacity)
+    vehicles = []
+    for vehicle_id in range(count):
+        vehicle = Vehicle(vehicle_id, None, 1, table=table)
+        vehicle.set_position((vehicle_id, -vehicle_id))
+        vehicles.append(vehicle)
+    return table, vehicles
+
+
+def depart(table, vehicle):
+    vehicle.in_network = False
+    vehicle.set_allotted_fog_node(None)
+    return table.remove_row(vehicle)
+
+
+def test_table_grows_and_keeps_positions():
+    table, vehicles = make_fleet(100)
+    assert table.size == 100 and table.capacity >= 100
+    for vehicle in vehicles:
+        assert vehicle.get_position() == (vehicle.id, -vehicle.id)
+    assert np.array_equal(table.positions[:table.size, 0], np.arange(100))
+
+
+def test_unallotted_vehicles():
+    table, vehicles = make_fleet(10)
+    for vehicle in vehicles[::2]:
+        vehicle.set_allotted_fog_node(object())
+    assert table.get_unallotted_vehicles() == vehicles[1::2]
+    vehicles[1].set_allotted_fog_node(object())
+    vehicles[0].set_allotted_fog_node(None)
+    assert table.get_unallotted_vehicles() == [vehicles[0]] + vehicles[3::2]
+
+
+def test_removed_vehicle_keeps_its_values():
+    table, vehicles = make_fleet(10)
+    vehicles[3].set_allotted_fog_node(object())
+    depart(table, vehicles[3])
+    assert vehicles[3].table is not table
+    assert vehicles[3].get_position() == (3, -3)
+    vehicles[3].set_position((7, 7))
+    assert vehicles[3].get_position() == (7, 7)
+    assert vehicles[3] not in table.get_unallotted_vehicles()
+    for vehicle in vehicles[:3]+vehicles[4:]:
+        assert vehicle.get_position() == (vehicle.id, -vehicle.id)
+
+
+def test_compaction_keeps_order_and_rows():
+    table, vehicles = make_fleet(100)
+    rng = np.random.RandomState(1)
+    live = list(vehicles)
+    compactions = 0
+    for vehicle in rng.permutation(vehicles)[:90]:
+        rows = depart(table, vehicle)
+        live.remove(vehicle)
+        if rows is not None:
+            compactions += 1
+            assert table.removed == 0 and table.size == len(live)
+            assert table.handles == live
+        assert table.size <= 2*len(live)+1
+        assert table.get_unallotted_vehicles() == live
+        for row in range(table.size):
+            handle = table.handles[row]
+            if handle is not None:
+                assert handle.row == row
+                assert handle.get_position() == (handle.id, -handle.id)
+    assert compactions > 0
+    assert table.capacity < 128
+
+
+def test_compaction_maps_old_rows_to_new_rows():
+    table, vehicles = make_fleet(5)
+    assert depart(table, vehicles[1]) is None
+    assert depart(table, vehicles[4]) is None
+    rows = depart(table, vehicles[2])
+    assert rows.tolist() == [0, -1, -1, 1, -1]
+    assert [vehicle.row for vehicle in table.handles] == [0, 1]
+    assert table.handles == [vehicles[0], vehicles[3]]
+    vehicle = Vehicle(5, None, 1, table=table)
+    assert vehicle.row == 2 and np.isnan(vehicle.get_position()[0])
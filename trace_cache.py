@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+# Bump when the layout of the cached columns changes
+FORMAT_VERSION = 1
+COLUMNS = {
+    "Frame_ID": np.int64,
+    "Vehicle_ID": np.int64,
+    "Global_X": np.float64,
+    "Global_Y": np.float64,
+}
+# Digests of the traces by absolute path, size and modification time
+DIGESTS = "digests.json"
+
+
+def file_hash(file_path):
+    """Returns the sha256 of the contents of the file"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_file_hash(file_path, cache_dir):
+    """
+    Returns the sha256 of the file from the digests of the cache directory,
+    the file is only hashed again when its size or modification time changes
+    """
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    digests_path = os.path.join(cache_dir, DIGESTS)
+    try:
+        with open(digests_path) as f:
+            digests = json.load(f)
+    except (OSError, ValueError):
+        digests = {}
+    entry = digests.get(path)
+    if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["digest"]
+    digest = file_hash(path)
+    digests[path] = {"size": stat.st_size,
+                     "mtime_ns": stat.st_mtime_ns, "digest": digest}
+    # Replace the digests atomically, a concurrent update that is lost only costs a hash
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(digests, f)
+    os.replace(tmp_path, digests_path)
+    return digest
+
+
+def _convert(file_path, cache_path):
+    """Parses the csv trace and writes its columns as .npy files sorted by vehicle and frame"""
+    import pandas as pd
+    df = pd.read_csv(file_path, usecols=list(COLUMNS))
+    columns = {name: df[name].to_numpy(dtype=dtype)
+               for name, dtype in COLUMNS.items()}
+    # Row keeps the position of every record in the original trace
+    columns["Row"] = np.arange(len(df), dtype=np.int64)
+    order = np.lexsort((columns["Frame_ID"], columns["Vehicle_ID"]))
+    # Write to a temporary directory first so that concurrent workers never
+    # see a partially written cache
+    parent = os.path.dirname(cache_path)
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent)
+    for name, column in columns.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), column[order])
+    try:
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        # Another process converted the same trace in the meantime
+        for name in columns:
+            os.remove(os.path.join(tmp_path, f"{name}.npy"))
+        os.rmdir(tmp_path)
+
+
+def load_trace(file_path, cache_dir=None):
+    """
+    Returns the columns of a mobility trace memory mapped from a binary cache
+    keyed by the hash of the file. The cache is created on the first load
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(
+            os.path.abspath(file_path)), ".trace_cache")
+    cache_path = os.path.join(
+        cache_dir, f"{cached_file_hash(file_path, cache_dir)}-v{FORMAT_VERSION}")
+    if not os.path.isdir(cache_path):
+        _convert(file_path, cache_path)
+    return {name: np.load(os.path.join(cache_path, f"{name}.npy"), mmap_mode="r")
+            for name in list(COLUMNS) + ["Row"]}
@@ -1,9 +1,108 @@
 import random
-from constants import TIME_MULTIPLIER, CACHE_CONTENT_TYPES
+import numpy as np
+from constants import CACHE_CONTENT_TYPES
+
+
+class Table:
+    """
+    Growable struct of arrays where every object owns one row of each column.
+    Rows of removed objects are dropped once they are half of the table, so
+    the table stays as large as the objects that are still in it
+    """
+
+    # name -> (dtype, width, fill value)
+    COLUMNS = {}
+
+    def __init__(self, capacity=256):
+        self.min_capacity = capacity
+        self.size = 0
+        self.removed = 0
+        self.handles = []
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        for name, (dtype, width, fill) in self.COLUMNS.items():
+            shape = (capacity,) if width == 1 else (capacity, width)
+            column = np.full(shape, fill, dtype=dtype)
+            if hasattr(self, name):
+                column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+
+    def add_row(self, handle):
+        """Appends a row for the handle, doubling the columns when they are full"""
+        if self.size == self.capacity:
+            self._allocate(2*self.capacity)
+        row = self.size
+        self.size += 1
+        self.handles.append(handle)
+        return row
+
+    @property
+    def capacity(self):
+        column = next(iter(self.COLUMNS))
+        return len(getattr(self, column))
+
+    def remove_row(self, handle):
+        """
+        Moves the handle to a table of its own and frees its row. Returns the
+        new row of every old row when the table was compacted, otherwise None
+        """
+        row = handle.row
+        own = type(self)(capacity=1)
+        handle.table, handle.row = own, own.add_row(handle)
+        for name, (dtype, width, fill) in self.COLUMNS.items():
+            column = getattr(self, name)
+            getattr(own, name)[0] = column[row]
+            column[row] = fill
+        self.handles[row] = None
+        self.removed += 1
+        if 2*self.removed > self.size:
+            return self.compact()
+        return None
+
+    def compact(self):
+        """Drops the freed rows, keeping the order of the others, and returns the new row of every old row"""
+        keep = np.fromiter((handle is not None for handle in self.handles),
+                           dtype=bool, count=self.size)
+        rows = np.full(self.size, -1, dtype=int)
+        rows[keep] = np.arange(np.count_nonzero(keep))
+        self.handles = [handle for handle in self.handles if handle is not None]
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            column[:len(self.handles)] = column[:self.size][keep]
+        for row, handle in enumerate(self.handles):
+            handle.row = row
+        self.size = len(self.handles)
+        self.removed = 0
+        capacity = max(self.min_capacity, 2*self.size)
+        if capacity < self.capacity:
+            self._allocate(capacity)
+        else:
+            for name, (dtype, width, fill) in self.COLUMNS.items():
+                getattr(self, name)[self.size:] = fill
+        return rows
+
+
+class VehicleTable(Table):
+    """Columns of the vehicles that are read for the whole fleet at once"""
+
+    COLUMNS = {
+        "positions": (float, 2, np.nan),
+        # True for vehicles in the network that no fog node serves
+        "unallotted": (bool, 1, False),
+    }
+
+    def get_unallotted_vehicles(self):
+        """Returns the vehicles in the network that are not allotted to any fog node"""
+        rows = np.flatnonzero(self.unallotted[:self.size])
+        return [self.handles[row] for row in rows]
 
 
 class Service:
 
+    __slots__ = ("vehicle", "id", "desired_data_rate",
+                 "content_type", "curr_power_consumed")
+
     def __init__(self, vehicle, service_id, desired_data_rate):
         self.vehicle = vehicle
         self.id = service_id
@@ -13,24 +112,36 @@ class Service:
 
 
 class Vehicle:
-    """Vehicle class to simulate driving vehicles in environment"""
+    """
+    Vehicle class to simulate driving vehicles in environment. The position
+    lives in a row of a VehicleTable, the mobility model writes the positions
+    of the whole fleet at once
+    """
 
-    def __init__(self, vehicle_id, env, desired_data_rate):
+    __slots__ = ("id", "mobility_model", "allotted_fog_node",
+                 "in_network", "table", "row")
+
+    def __init__(self, vehicle_id, env, desired_data_rate, table=None):
         self.id = vehicle_id
-        self.driving_process = env.process(self._drive(env))
         self.mobility_model = None
-        self._position = None
         self.allotted_fog_node = None
         self.in_network = True
+        self.table = table if table is not None else VehicleTable(capacity=1)
+        self.row = self.table.add_row(self)
+        self.table.unallotted[self.row] = True
 
     def get_position(self):
-        return self._position
+        positions = self.table.positions
+        return (positions.item(self.row, 0), positions.item(self.row, 1))
+
+    def set_position(self, position):
+        """Sets the position of the vehicle, called by the mobility model that drives it"""
+        self.table.positions[self.row] = position
 
     def set_mobility_model(self, mobility_model):
         self.mobility_model = mobility_model
 
-    def _drive(self, env):
-        for position in self.mobility_model.positions(self):
-            self._position = position
-            # print(f'Vehicle {self.id} is at {self._position}')
-            yield env.timeout(0.1*TIME_MULTIPLIER)
+    def set_allotted_fog_node(self, fog_node):
+        """Allots the vehicle to fog_node, or to no fog node when it is None"""
+        self.allotted_fog_node = fog_node
+        self.table.unallotted[self.row] = fog_node is None and self.in_network